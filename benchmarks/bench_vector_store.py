@@ -0,0 +1,113 @@
+"""Recall@k vs memory and upsert time for QdrantStore storage options.
+
+Usage:
+    python benchmarks/bench_vector_store.py --n 20000 --dim 768
+    python benchmarks/bench_vector_store.py --url http://localhost:6333   # HNSW/int8 need a server
+    python benchmarks/bench_vector_store.py --vectors .embed_cache/<model>/vectors.npy
+
+Without --url the embedded store is used, which always searches exactly, so
+only upsert time, query time and disk footprint differ between configurations.
+"""
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+
+from agentic_docs.index.store_qdrant import QdrantStore
+
+CONFIGS = {
+    "float32 ram": {},
+    "float32 on-disk": {"on_disk": True, "on_disk_payload": True},
+    "int8 ram": {"quantization": "int8"},
+    "int8 + on-disk originals": {"quantization": "int8", "on_disk": True, "on_disk_payload": True},
+    "float32 hnsw m=8": {"hnsw_m": 8, "hnsw_ef_construct": 64},
+}
+
+
+def clustered_vectors(n: int, dim: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Gaussian blobs, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = q @ unit.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def resident_bytes(n: int, dim: int, options: dict) -> int:
+    """Estimated RAM held for vectors: originals unless on disk, int8 copies, HNSW links."""
+    total = 0 if options.get("on_disk") else n * dim * 4
+    if options.get("quantization") == "int8":
+        total += n * dim
+    # Layer-0 HNSW graph: 2*m neighbours of 4 bytes per point
+    total += n * 2 * options.get("hnsw_m", 16) * 4
+    return total
+
+
+def disk_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+@click.command()
+@click.option("--n", default=20_000, help="Number of vectors (ignored with --vectors)")
+@click.option("--dim", default=768, help="Vector dimension (ignored with --vectors)")
+@click.option("--vectors", "vectors_path", type=click.Path(exists=True, dir_okay=False), help=".npy file of real vectors")
+@click.option("--queries", default=200, help="Number of query vectors")
+@click.option("--k", default=10, help="Neighbours per query")
+@click.option("--url", help="Qdrant server URL; embedded store if omitted")
+@click.option("--batch-size", default=256, help="Upsert chunk size")
+def main(n, dim, vectors_path, queries, k, url, batch_size):
+    if vectors_path:
+        vectors = np.load(vectors_path, mmap_mode="r")
+        vectors = np.asarray(vectors[np.linalg.norm(vectors, axis=1) > 0], dtype=np.float32)
+    else:
+        vectors = clustered_vectors(n, dim)
+    n, dim = vectors.shape
+    rng = np.random.default_rng(1)
+    query_vecs = vectors[rng.choice(n, size=min(queries, n), replace=False)]
+    query_vecs = query_vecs + 0.05 * rng.standard_normal(query_vecs.shape).astype(np.float32)
+    truth = exact_top_k(vectors, query_vecs, k)
+    metadatas = [{"symbol_id": str(i), "qualname": f"sym_{i}", "file": "bench.py"} for i in range(n)]
+
+    print(f"{n} vectors x {dim}, {len(query_vecs)} queries, k={k}, "
+          f"{'server ' + url if url else 'embedded store (exact search)'}")
+    print(f"{'config':<28}{'recall@k':>10}{'RAM est MB':>12}{'disk MB':>10}{'upsert s':>10}{'query ms':>10}")
+    for name, options in CONFIGS.items():
+        tmp = Path(tempfile.mkdtemp(prefix="bench_qdrant_"))
+        collection = "bench_" + name.replace(" ", "_").replace("=", "").replace("+", "")
+        store = QdrantStore(
+            index_path=tmp, collection_name=collection, dim=dim, url=url,
+            search_ef=128 if url else None, upsert_batch_size=batch_size, **options
+        )
+        try:
+            store.reset()
+            start = time.perf_counter()
+            store.add(vectors, metadatas)
+            upsert = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = store.search_batch(query_vecs, k=k)
+            query_ms = (time.perf_counter() - start) * 1000 / len(query_vecs)
+
+            hits = [len({int(r["symbol_id"]) for r in res} & set(row.tolist())) for res, row in zip(results, truth)]
+            recall = sum(hits) / (k * len(truth))
+            disk = disk_bytes(tmp) if not url else 0
+            print(f"{name:<28}{recall:>10.3f}{resident_bytes(n, dim, options) / 1e6:>12.1f}"
+                  f"{disk / 1e6:>10.1f}{upsert:>10.2f}{query_ms:>10.2f}")
+            if url:
+                store.client.delete_collection(collection)
+        finally:
+            store.close()
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,232 @@
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableSerializable
-from ..llm.prompts import CODE_EXPERT_PROMPT, DOCS_EXPERT_PROMPT, AGENT_PROMPT, UPDATE_DOCS_PROMPT
+from langchain_core.prompts import PromptTemplate
+from ..llm.prompts import CODE_EXPERT_PROMPT, DOCS_EXPERT_PROMPT, AGENT_PROMPT, UPDATE_DOCS_PROMPT, FUSED_DOCS_PROMPT, BATCH_DOCS_PROMPT
+from ..llm.tokens import TokenBudget, estimate_tokens, usage_from_response
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
 import re
 
+# LLM attributes that change the output for a given prompt
+SAMPLING_PARAMS = ("temperature", "top_p", "max_tokens", "stop", "seed")
+
+# The orchestrator runs the tools, so the model must stop before inventing an observation
+AGENT_STOP = ["\nObservation:"]
+# Start of a tool call; the stream can be cut once its input is complete (see action_end)
+ACTION_READY_RE = re.compile(r"Action:[^\n]*\S[^\n]*\nAction Input:[ \t]*")
+INPUT_START_RE = re.compile(r"`*\s*")
+
+def action_end(text: str) -> Optional[int]:
+    """Offset just past a complete tool call in `text`, or None while it is incomplete.
+
+    A single-line input ends at the end of its line. A JSON object may span
+    lines, so it ends where the object stops decoding.
+    """
+    if "Final Answer:" in text:
+        return None
+    match = ACTION_READY_RE.search(text)
+    if match is None:
+        return None
+    pos = INPUT_START_RE.match(text, match.end()).end()
+    if text.startswith("{", pos):
+        try:
+            return json.JSONDecoder().raw_decode(text, pos)[1]
+        except ValueError:
+            return None
+    newline = text.find("\n", pos)
+    if newline == -1 or not text[pos:newline].strip():
+        return None
+    return newline
+
+def _cut(text: str, until: Optional[Callable[[str], Optional[int]]]) -> str:
+    """Drop whatever arrived after the point where `until` stopped the stream."""
+    end = until(text) if until is not None else None
+    return text if end is None else text[:end]
+
+def _text(response: Any) -> str:
+    return response.content if hasattr(response, "content") else str(response)
+
+def render_batch(items: List[Tuple[str, str]]) -> str:
+    """Render (symbol_id, code) pairs for BATCH_DOCS_PROMPT."""
+    return "\n\n".join(f"Symbol id: {sid}\n```python\n{code}\n```" for sid, code in items)
+
+def split_batched_output(text: str, symbol_ids: List[str]) -> Optional[Dict[str, str]]:
+    """Split a batched response into per-symbol markdown.
+
+    Returns None unless every symbol has exactly one non-empty delimited block,
+    so the caller can fall back to per-symbol requests.
+    """
+    sections = {}
+    for sid in symbol_ids:
+        blocks = re.findall(
+            rf"<<<BEGIN {re.escape(sid)}>>>(.*?)<<<END {re.escape(sid)}>>>", text, flags=re.DOTALL
+        )
+        if len(blocks) != 1 or not blocks[0].strip():
+            return None
+        sections[sid] = blocks[0]
+    return sections
+
 class DocumentationAgents:
-    def __init__(self, llm):
+    def __init__(self, llm, cache=None, budget: Optional[TokenBudget] = None):
         self.llm = llm
+        # Optional LLMCache shared by every prompt below
+        self.cache = cache
+        # Token accounting for every LLM call (cache hits are free)
+        self.budget = budget or TokenBudget()
+
+    def _cache_key(self, template: str, inputs: Dict[str, Any], stop: Optional[List[str]] = None) -> str:
+        model = getattr(self.llm, "model_name", None) or getattr(self.llm, "model_path", None)
+        params = {p: getattr(self.llm, p, None) for p in SAMPLING_PARAMS}
+        if stop:
+            params["call_stop"] = stop
+        return self.cache.make_key(model, template, inputs, params)
+
+    def _record(self, response: Any, prompt: str) -> str:
+        prompt_tokens, completion_tokens, text = usage_from_response(response, prompt)
+        self.budget.record(prompt_tokens, completion_tokens)
+        return text
+
+    def _stream(self, prompt: str, stop: Optional[List[str]], until: Callable[[str], Optional[int]]) -> Any:
+        """Stream a completion, closing the stream as soon as `until(text so far)` returns an offset."""
+        acc = None
+        chunks = self.llm.stream(prompt, stop=stop)
+        try:
+            for chunk in chunks:
+                acc = chunk if acc is None else acc + chunk
+                if until(_text(acc)) is not None:
+                    break
+        finally:
+            chunks.close()
+        return acc if acc is not None else ""
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]], until: Callable[[str], Optional[int]]) -> Any:
+        acc = None
+        chunks = self.llm.astream(prompt, stop=stop)
+        try:
+            async for chunk in chunks:
+                acc = chunk if acc is None else acc + chunk
+                if until(_text(acc)) is not None:
+                    break
+        finally:
+            await chunks.aclose()
+        return acc if acc is not None else ""
+
+    def _invoke(self, template: PromptTemplate, inputs: Dict[str, Any],
+                stop: Optional[List[str]] = None, until: Optional[Callable[[str], Optional[int]]] = None) -> str:
+        """Render a prompt, call the LLM (through the cache) and account its tokens.
         
-        # Static Chains
-        self.code_expert = CODE_EXPERT_PROMPT | llm | StrOutputParser()
-        self.docs_expert = DOCS_EXPERT_PROMPT | llm | StrOutputParser()
-        self.docs_updater = UPDATE_DOCS_PROMPT | llm | StrOutputParser()
+        With `until`, the response is streamed, closed once `until` returns an
+        offset, and cut there (the last chunk may carry text past that point).
+        """
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(template.template, inputs, stop)
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
+        prompt = template.format(**inputs)
+        if until is not None:
+            response = self._stream(prompt, stop, until)
+        elif stop:
+            response = self.llm.invoke(prompt, stop=stop)
+        else:
+            response = self.llm.invoke(prompt)
+        result = _cut(self._record(response, prompt), until)
+        if key is not None:
+            self.cache.put(key, result)
+        return result
+
+    async def _ainvoke(self, template: PromptTemplate, inputs: Dict[str, Any],
+                       stop: Optional[List[str]] = None, until: Optional[Callable[[str], Optional[int]]] = None) -> str:
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(template.template, inputs, stop)
+            hit = self.cache.get(key)
+            if hit is not None:
+                return hit
+        prompt = template.format(**inputs)
+        if until is not None:
+            response = await self._astream(prompt, stop, until)
+        elif stop:
+            response = await self.llm.ainvoke(prompt, stop=stop)
+        else:
+            response = await self.llm.ainvoke(prompt)
+        result = _cut(self._record(response, prompt), until)
+        if key is not None:
+            self.cache.put(key, result)
+        return result
 
     def analyze_code(self, code: str, context: str = "") -> str:
         """Analyze code using static chain."""
-        return self.code_expert.invoke({"code": code, "context": context})
+        return self._invoke(CODE_EXPERT_PROMPT, {"code": code, "context": context})
 
-    def ask_agent(self, code: str, context: str, scratchpad: str, tool_names: str, tools_desc: str) -> str:
-        """Single step of the agent reasoning (stateless)."""
+    def _agent_inputs(self, code: str, context: str, scratchpad: str, tool_names: str, tools_desc: str) -> Dict[str, str]:
         input_text = f"Code:\n```python\n{code}\n```\n\nContext:\n{context}"
+
+        return {
+            "input": input_text,
+            "agent_scratchpad": scratchpad,
+            "tool_names": tool_names,
+            "tools": tools_desc
+        }
+
+    def agent_prompt_tokens(self, code: str, context: str, tool_names: str, tools_desc: str) -> int:
+        """Estimated size of the agent prompt with an empty scratchpad."""
+        return estimate_tokens(AGENT_PROMPT.format(**self._agent_inputs(code, context, "", tool_names, tools_desc)))
+
+    def ask_agent(self, code: str, context: str, scratchpad: str, tool_names: str, tools_desc: str,
+                  stream: bool = False) -> str:
+        """Single step of the agent reasoning (stateless).
         
-        prompt = AGENT_PROMPT.format(
-            input=input_text,
-            agent_scratchpad=scratchpad,
-            tool_names=tool_names,
-            tools=tools_desc
-        )
-        
-        response = self.llm.invoke(prompt)
-        return response.content if hasattr(response, "content") else str(response)
+        Generation stops at "Observation:"; with `stream`, it also stops as soon
+        as a complete Action / Action Input pair has been produced.
+        """
+        inputs = self._agent_inputs(code, context, scratchpad, tool_names, tools_desc)
+        return self._invoke(AGENT_PROMPT, inputs, stop=AGENT_STOP, until=action_end if stream else None)
 
     def generate_docs(self, analysis: str, existing_docs: str = "") -> str:
         """Generate docs from analysis."""
-        return self.docs_expert.invoke({"analysis": analysis, "existing_docs": existing_docs})
+        return self._invoke(DOCS_EXPERT_PROMPT, {"analysis": analysis, "existing_docs": existing_docs})
 
     def update_docs(self, analysis: str, existing_docs: str) -> str:
         """Update existing docs based on analysis."""
-        return self.docs_updater.invoke({"analysis": analysis, "existing_docs": existing_docs})
+        return self._invoke(UPDATE_DOCS_PROMPT, {"analysis": analysis, "existing_docs": existing_docs})
+
+    def fused_docs(self, code: str, context: str = "") -> str:
+        """Code and context straight to the final Markdown section (one call)."""
+        return self._invoke(FUSED_DOCS_PROMPT, {"code": code, "context": context})
+
+    def batch_docs(self, items: List[Tuple[str, str]], context: str = "") -> Optional[Dict[str, str]]:
+        """Document several (symbol_id, code) pairs in one call; None if the output doesn't split."""
+        text = self._invoke(BATCH_DOCS_PROMPT, {"symbols": render_batch(items), "context": context})
+        return split_batched_output(text, [sid for sid, _ in items])
+
+    # Async variants: same prompts, driven through the LLM's native async API
+
+    async def aanalyze_code(self, code: str, context: str = "") -> str:
+        return await self._ainvoke(CODE_EXPERT_PROMPT, {"code": code, "context": context})
+
+    async def aask_agent(self, code: str, context: str, scratchpad: str, tool_names: str, tools_desc: str,
+                         stream: bool = False) -> str:
+        inputs = self._agent_inputs(code, context, scratchpad, tool_names, tools_desc)
+        return await self._ainvoke(AGENT_PROMPT, inputs, stop=AGENT_STOP, until=action_end if stream else None)
+
+    async def agenerate_docs(self, analysis: str, existing_docs: str = "") -> str:
+        return await self._ainvoke(DOCS_EXPERT_PROMPT, {"analysis": analysis, "existing_docs": existing_docs})
+
+    async def aupdate_docs(self, analysis: str, existing_docs: str) -> str:
+        return await self._ainvoke(UPDATE_DOCS_PROMPT, {"analysis": analysis, "existing_docs": existing_docs})
+
+    async def afused_docs(self, code: str, context: str = "") -> str:
+        return await self._ainvoke(FUSED_DOCS_PROMPT, {"code": code, "context": context})
+
+    async def abatch_docs(self, items: List[Tuple[str, str]], context: str = "") -> Optional[Dict[str, str]]:
+        text = await self._ainvoke(BATCH_DOCS_PROMPT, {"symbols": render_batch(items), "context": context})
+        return split_batched_output(text, [sid for sid, _ in items])
 
     def clean_output(self, text: str) -> str:
         """Clean the LLM output to remove thinking tags and markdown fences."""
         # Remove <think> blocks (common in reasoning models)
         text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-        
+
         # Remove markdown code fences if the model wrapped the whole output
         text = text.strip()
         if text.startswith("```markdown"):
@@ -51,5 +235,5 @@ class DocumentationAgents:
             text = text[3:]
         if text.endswith("```"):
             text = text[:-3]
-            
+
         return text.strip()
@@ -1,18 +1,62 @@
 """Orchestrator for the Agentic RAG pipeline."""
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import csv
 import os
 import signal
 import sys
+import time
 import atexit
 import re
+import numpy as np
 from tqdm import tqdm
 
-from ..parsing.symbols import index_repo, Symbol
+from ..parsing.graph import build_dependency_graph, direct_dependents, generation_levels
+from ..parsing.symbols import iter_index_repo, Symbol
 from ..index.embed import Embedder
-from ..agent.agents import DocumentationAgents
-from ..io.markdown_writer import MarkdownWriter
-from ..agent.tools import read_file, list_directory, search_code
+from ..index.manifest import SymbolManifest
+from ..index.neighbors import NeighborTable
+from ..index.symbol_table import SymbolTable
+from ..index.trigram import TrigramIndex
+from ..io.markdown_writer import MarkdownWriter, read_section_contents, read_section_hashes
+from ..io.source_cache import SourceCache
+from ..llm.tokens import CHARS_PER_TOKEN, CallStats, TokenBudget, estimate_tokens, track_usage
+
+# Number of changed symbols collected from the parser before embedding them
+EMBED_FLUSH_SIZE = 256
+
+# Token cost estimate used to reserve budget before a symbol starts:
+# prompt template preamble and expected completion length per LLM call,
+# and the number of calls per symbol in each mode (agentic: a few ReAct steps).
+PROMPT_OVERHEAD_TOKENS = 300
+EST_COMPLETION_TOKENS = 512
+STATIC_CALLS = 2
+CALLS_PER_SYMBOL = {"static": STATIC_CALLS, "agentic": 4, "fused": 1}
+
+# Agent loop: tokens kept free for each ReAct completion, and how much of an
+# older tool observation survives once the scratchpad has to be compacted
+AGENT_COMPLETION_RESERVE = 1024
+OLD_OBSERVATION_CHARS = 400
+
+# Callee docs quoted in a caller's context are cut to this many characters
+CALLEE_DOC_CHARS = 600
+
+# Symbols listed individually in the over-budget report
+MAX_REPORTED_SKIPS = 50
+
+def _embed_text(sym: Symbol) -> str:
+    """Text used to embed a symbol for indexing and context retrieval."""
+    return sym.docstring or sym.signature or sym.qualname
+
+@dataclass
+class IndexResult:
+    """Outcome of the index stage, handed to generate()."""
+    symbols: List[Symbol]
+    changed: List[Symbol]
+    removed: List[str]
+    vectors: Dict[str, np.ndarray] = field(default_factory=dict)  # symbol_id -> vector
 
 class Orchestrator:
     def __init__(self, config: dict):
@@ -24,200 +68,995 @@ class Orchestrator:
         # Initialize components
         self.embedder = Embedder(
             model_name=config.get("embed_model", "intfloat/e5-base-v2"),
-            device=config.get("device", "cpu")
+            device=config.get("device", "cpu"),
+            cache_dir=self.root / ".embed_cache",
+            cache_size=int(config.get("embed_cache_size", 200_000)),
+            cache_dtype=config.get("embed_cache_dtype", "float32"),
+            batch_size=int(config.get("embed_batch_size", 32)),
+            batch_tokens=int(config.get("embed_batch_tokens", 8192)),
+            processes=int(config.get("embed_processes", 1))
+        )
+        
+        backend = config.get("vector_store", "qdrant")
+        if backend == "numpy":
+            from ..index.store_numpy import NumpyStore
+            self.store = NumpyStore(
+                index_path=self.root / ".vector_store",
+                dim=self.embedder.dim,
+                dtype=config.get("numpy_store_dtype", "float32")
+            )
+            print("Using NumPy vector store.")
+        elif backend == "qdrant":
+            from ..index.store_qdrant import QdrantStore
+            self.store = QdrantStore(
+                index_path=self.root / ".qdrant",
+                dim=self.embedder.dim,
+                url=config.get("qdrant_url") or None,
+                quantization=config.get("qdrant_quantization") or None,
+                on_disk=bool(config.get("qdrant_on_disk", False)),
+                on_disk_payload=bool(config.get("qdrant_on_disk_payload", False)),
+                hnsw_m=config.get("qdrant_hnsw_m"),
+                hnsw_ef_construct=config.get("qdrant_hnsw_ef_construct"),
+                search_ef=config.get("qdrant_search_ef"),
+                upsert_batch_size=int(config.get("qdrant_upsert_batch_size", 256))
+            )
+            print("Using Qdrant vector store.")
+        else:
+            raise ValueError(f"Unknown vector_store: {backend}")
+        
+        # symbol_id -> hash of everything currently in the store
+        self.manifest = SymbolManifest(
+            self.root / f".{backend}_manifest.json",
+            model_name=self.embedder.model_name,
+            dim=self.embedder.dim,
+            store_dtype=config.get("numpy_store_dtype", "float32") if backend == "numpy" else "float32"
         )
         
-        from ..index.store_qdrant import QdrantStore
-        self.store = QdrantStore(index_path=self.root / ".qdrant")
-        print("Using Qdrant vector store.")
+        # Optional precomputed k-NN table over all symbols, refreshed by index()
+        self.neighbors = None
+        if config.get("precompute_neighbors"):
+            self.neighbors = NeighborTable(
+                self.root / ".neighbors.npz",
+                model_name=self.embedder.model_name,
+                k=int(config.get("k", 8))
+            )
         
         # Register cleanup handlers
         atexit.register(self._cleanup)
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
         
+        # Per-run source lines; waves run in file order, so each file is read about once per wave
+        self.sources = SourceCache(max_files=4 * int(config.get("max_workers", 4)) + 16)
+        # Trigram index behind the search_code tool, refreshed by index()
+        self.search_index = TrigramIndex(self.root / ".search_index.npz", read_lines=self.sources.lines)
+        # Parsed symbols by qualname for the get_symbol/get_signature tools, filled by generate()
+        self.symbol_table = SymbolTable()
+        
+        # LLM, agents and writer are only needed for generation (see _init_generation)
+        self.agents = None
+        self.writer = None
+        self.tools = {}
+
+    def _init_generation(self):
+        """Create the LLM client, agents, writer and tools on first use."""
+        if self.agents is not None:
+            return
+        config = self.config
+        # Imported here so the index stage doesn't pay for LangChain
+        from ..agent.agents import DocumentationAgents
+        from ..agent.tools import ToolMemo, make_tools
+        
         # LLM & Agents
         model_name = config.get("llm_model_name", "default")
         
-        # Use API LLM
-        from ..llm.api_llm import APILLM
-        print(f"Using API LLM at {config.get('llm_api_base')}")
-        llm = APILLM(
-            base_url=config.get("llm_api_base"),
-            api_key=config.get("llm_api_key"),
-            model_name=model_name
-        )
-        self.agents = DocumentationAgents(llm)
+        backend = config.get("llm_backend", "api")
+        if backend == "local":
+            from ..llm.local_llm import LocalLLM
+            print(f"Using local LLM {config.get('llm_model_path')}")
+            llm = LocalLLM(
+                model_path=config.get("llm_model_path"),
+                n_ctx=int(config.get("n_ctx", 4096)),
+                n_gpu_layers=int(config.get("n_gpu_layers", 0)),
+                n_instances=int(config.get("local_llm_instances", 1)),
+                prompt_cache_mb=int(config.get("local_prompt_cache_mb", 1024))
+            )
+        elif backend == "api":
+            from ..llm.api_llm import APILLM
+            print(f"Using API LLM at {config.get('llm_api_base')}")
+            llm = APILLM(
+                base_url=config.get("llm_api_base"),
+                api_key=config.get("llm_api_key"),
+                model_name=model_name
+            )
+        else:
+            raise ValueError(f"Unknown LLM backend: {backend}")
+        cache = None
+        if config.get("llm_cache", True):
+            from ..llm.cache import LLMCache
+            cache = LLMCache(
+                self.root / ".llm_cache.sqlite",
+                max_entries=int(config.get("llm_cache_size", 50_000))
+            )
+        self.budget = TokenBudget(int(config.get("budget_tokens", 0)))
+        self.agents = DocumentationAgents(llm, cache=cache, budget=self.budget)
         self.writer = MarkdownWriter(self.docs_root)
         
-        # Tools for Agentic Mode
-        self.tools = {
-            "read_file": read_file,
-            "list_directory": list_directory,
-            "search_code": search_code
-        }
+        # Tools for Agentic Mode; a single observation may take at most a quarter of the window
+        max_chars = min(
+            int(config.get("max_observation_chars", 6000)),
+            int(config.get("n_ctx", 4096)) * CHARS_PER_TOKEN // 4
+        )
+        self.tools = make_tools(
+            root=str(self.root), sources=self.sources, max_chars=max_chars, search_index=self.search_index,
+            symbols=self.symbol_table, embedder=self.embedder, store=self.store, neighbors=self.neighbors
+        )
+        self.tool_memo = ToolMemo(max_entries=int(config.get("tool_memo_size", 1024)))
 
     def run(self, changed_only: bool = False):
-        """Run the full pipeline."""
+        """Run the full pipeline: index, then generate."""
         print(f"Starting orchestration (mode={self.mode}, changed_only={changed_only})...")
-        
-        # 1. Parse & Index
+        result = self.index()
+        self.generate(result, changed_only=changed_only)
+
+    def index(self) -> IndexResult:
+        """Parse, embed and store. Needs no LLM; safe to run on every push."""
+        # Parsing streams symbol batches, so embedding starts before parsing
+        # finishes. Only symbols that changed since the last run are embedded.
         print("Parsing codebase...")
-        symbols = index_repo(str(self.root), all_=not changed_only, changed_only=changed_only)
-        print(f"Found {len(symbols)} symbols.")
+        mismatch = self._store_mismatch()
+        if mismatch:
+            # Store deleted, partly lost, unreadable or built differently: the manifest can't be trusted
+            print(f"Vector store does not match the manifest ({mismatch}), re-indexing everything.")
+            self.manifest.clear()
+        if not self.manifest.hashes:
+            # No usable manifest: the collection may hold points we can't account for
+            self.store.reset()
         
-        # Embed and Store (Naive full re-index for now)
-        print("Embedding symbols...")
-        texts = [s.docstring or s.signature or s.qualname for s in symbols]
-        vectors = self.embedder.encode(texts)
+        symbols: List[Symbol] = []
+        changed: List[Symbol] = []
+        pending: List[Symbol] = []
+        # symbol_id -> vector, reused by the retrieval stage of generate()
+        vectors_by_id: Dict[str, np.ndarray] = {}
         
-        metadatas = [
-            {
-                "symbol_id": s.symbol_id,
-                "qualname": s.qualname,
-                "file": s.file,
-                "hash": s.hash
-            }
-            for s in symbols
-        ]
+        # Hand a process pool enough texts per call to keep every worker busy
+        flush_size = EMBED_FLUSH_SIZE * max(1, self.embedder.processes)
+        batches = iter_index_repo(
+            str(self.root),
+            workers=int(self.config.get("parse_workers", 0)),
+            chunk_size=int(self.config.get("parse_chunk_size", 64)),
+            discovery=self.config.get("discovery", "auto"),
+            include=self.config.get("include") or None,
+            exclude=self.config.get("exclude") or None
+        )
+        for batch in batches:
+            symbols.extend(batch)
+            batch_changed = self.manifest.changed(batch)
+            changed.extend(batch_changed)
+            pending.extend(batch_changed)
+            if len(pending) >= flush_size:
+                vectors_by_id.update(self._embed_and_store(pending))
+                pending = []
+        if pending:
+            vectors_by_id.update(self._embed_and_store(pending))
+        self.embedder.flush()
         
-        print("Storing embeddings in Qdrant...")
-        self.store.add(vectors, metadatas)
+        removed = self.manifest.removed(symbols)
+        print(f"Found {len(symbols)} symbols: {len(changed)} new or changed, {len(removed)} removed.")
         
-        # 2. Generate & Write
-        from concurrent.futures import ThreadPoolExecutor, as_completed
+        # Changed symbols are overwritten in place by upsert; only drop the vanished ones
+        if removed:
+            print("Removing stale embeddings from the vector store...")
+            self.store.delete_by_symbol_ids(removed)
+        self.store.save()
+        
+        self.manifest.update(changed, removed)
+        # Docs are owed for these until a generate run writes them
+        self.manifest.mark_pending(s.symbol_id for s in changed if s.kind != "module")
+        self.manifest.save()
+        
+        if self.neighbors is not None:
+            self._update_neighbors(symbols, vectors_by_id)
+        
+        # Only files whose mtime/size moved are re-read
+        updated = self.search_index.refresh({s.file for s in symbols})
+        if updated:
+            print(f"Search index: {updated} files updated, {len(self.search_index)} indexed.")
+            self.search_index.save()
+        return IndexResult(symbols=symbols, changed=changed, removed=removed, vectors=vectors_by_id)
+
+    def generate(self, result: Optional[IndexResult] = None, changed_only: bool = False):
+        """Generate docs against the index.
+        
+        Without a result from this run, the index is brought up to date first;
+        when nothing changed that costs a parse and no embedding.
+        """
+        if result is None:
+            result = self.index()
+        self._init_generation()
+        # Tool results are only valid for this run (files may change between runs)
+        self.tool_memo.clear()
+        symbols, changed, vectors_by_id = result.symbols, result.changed, result.vectors
+        self.symbol_table.update(symbols)
         
         max_workers = int(self.config.get("max_workers", 4))
-        symbols_to_process = [s for s in symbols if s.kind != "module"]
+        # Changed since docs were last generated, including changes a separate
+        # `index` run already recorded (see SymbolManifest.pending)
+        changed_ids = {s.symbol_id for s in changed} | self.manifest.pending
+        candidates = [s for s in symbols if s.symbol_id in changed_ids] if changed_only else symbols
+        symbols_to_process = [s for s in candidates if s.kind != "module"]
+        if changed_only:
+            print(f"{len(symbols_to_process)} symbols changed since the last generate.")
+        # Most important symbols first so a token budget cuts the least useful work
+        self.graph = build_dependency_graph(symbols)
+        change_scores = self._change_scores(symbols, changed_ids)
+        symbols_to_process.sort(key=lambda s: self._priority(s, change_scores))
+        self._budget_skipped: List[Symbol] = []
+        self._budget_exhausted = False
+        # (symbol, CallStats) for every symbol generated this run
+        self._symbol_stats: List[Tuple[Symbol, CallStats]] = []
+        
+        # Skip symbols whose generated section already carries the current hash
+        skipped: List[Symbol] = []
+        if not self.config.get("force"):
+            symbols_to_process, skipped = self._drop_up_to_date(symbols_to_process)
+            print(f"{len(skipped)} symbols up to date, {len(symbols_to_process)} to (re)generate.")
+        
+        # A changed symbol's direct callers get re-documented too
+        if self.config.get("propagate_changes", True):
+            symbols_to_process, skipped = self._queue_dependents(symbols, symbols_to_process, skipped)
+            symbols_to_process.sort(key=lambda s: self._priority(s, change_scores))
+        
+        # Retrieve context for every symbol up front, in batches
+        contexts = self._retrieve_contexts(symbols_to_process, vectors_by_id)
+        
+        # The budget cut is made in priority order before dependency waves reorder the work
+        selected = self._select_within_budget(symbols_to_process, contexts)
+        
+        # Callees first: each wave only starts once the symbols it calls are documented,
+        # so their fresh docs can go into its context
+        waves = self._dependency_waves(selected)
+        if len(waves) > 1:
+            print(f"Generating in dependency order ({len(waves)} levels).")
+        self._generated_docs: Dict[str, str] = {}
+        self._page_docs: Dict[Path, Dict[str, str]] = {}
+        
+        if self.config.get("async_generation"):
+            print(f"Generating documentation with asyncio (max {self.config.get('max_concurrency', 64)} in flight)...")
+            # One event loop for every wave: the async HTTP client's pooled connections are tied to it
+            regenerated = asyncio.run(self._generate_waves_async(waves, contexts))
+        else:
+            regenerated = 0
+            for wave in waves:
+                regenerated += self._dispatch(self._prepare_wave(wave, contexts), contexts, max_workers)
+
+        print("Writing documentation pages...")
+        self.writer.flush()
+        if not self.config.get("dry_run"):
+            # Written or already up to date; failures and over-budget symbols stay pending
+            self.manifest.clear_pending({s.symbol_id for s, _ in self._symbol_stats} | {s.symbol_id for s in skipped})
+            self.manifest.save()
+        over_budget = self._budget_skipped
+        failed = len(symbols_to_process) - regenerated - len(over_budget)
+        print(f"Summary: {regenerated} regenerated, {len(skipped)} skipped (up to date), "
+              f"{len(over_budget)} skipped (token budget), {failed} failed.")
+        print(self.budget.summary())
+        self._report_symbol_stats()
+        if over_budget:
+            print("Not generated (token budget exhausted):")
+            for sym in over_budget[:MAX_REPORTED_SKIPS]:
+                print(f"  - {sym.qualname}")
+            if len(over_budget) > MAX_REPORTED_SKIPS:
+                print(f"  ... and {len(over_budget) - MAX_REPORTED_SKIPS} more")
+        if self.agents.cache is not None:
+            print(self.agents.cache.stats())
+        if self.mode == "agentic":
+            print(self.tool_memo.stats())
+        print("Orchestration complete.")
+
+    def _prepare_wave(self, wave: List[Symbol], contexts: Dict[str, str]) -> List[List[Symbol]]:
+        """Add callee docs to a wave's contexts and split it into work units."""
+        self._add_callee_docs(wave, contexts)
+        
+        # Work units: one symbol each, or batches of small symbols (batch_small_symbols)
+        units = self._plan_units(wave)
+        if len(units) < len(wave):
+            print(f"Packed {len(wave)} symbols into {len(units)} requests.")
+        return units
+
+    async def _generate_waves_async(self, waves: List[List[Symbol]], contexts: Dict[str, str]) -> int:
+        """Run the waves one after another on a single event loop."""
+        regenerated = 0
+        for wave in waves:
+            regenerated += await self._generate_async(self._prepare_wave(wave, contexts), contexts)
+        return regenerated
+
+    def _dispatch(self, units: List[List[Symbol]], contexts: Dict[str, str], max_workers: int) -> int:
+        """Run work units on worker threads (or sequentially); returns how many symbols were written."""
+        from concurrent.futures import ThreadPoolExecutor, as_completed
         
+        regenerated = 0
         if max_workers <= 1:
             print("Generating documentation sequentially...")
-            for sym in tqdm(symbols_to_process, desc="Generating docs", unit="symbol"):
-                self._process_symbol_with_context(sym)
+            for unit in tqdm(units, desc="Generating docs", unit="task"):
+                regenerated += self._process_unit(unit, contexts)
         else:
             print(f"Generating documentation with {max_workers} workers...")
-            # We do context retrieval inside the worker to avoid pre-fetching everything if not needed
             with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [executor.submit(self._process_symbol_with_context, sym) for sym in symbols_to_process]
+                futures = [executor.submit(self._process_unit, unit, contexts) for unit in units]
                 
-                for future in tqdm(as_completed(futures), total=len(futures), desc="Generating docs", unit="symbol"):
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Generating docs", unit="task"):
                     try:
-                        future.result()
+                        regenerated += future.result()
                     except Exception as e:
                         print(f"\nWorker failed: {e}")
+        return regenerated
 
-        print("Orchestration complete.")
+    def _queue_dependents(self, symbols: List[Symbol], to_process: List[Symbol],
+                          skipped: List[Symbol]) -> Tuple[List[Symbol], List[Symbol]]:
+        """Add the direct callers of every queued symbol, even if their own source is unchanged."""
+        queued = {s.symbol_id for s in to_process}
+        dependent_ids = direct_dependents(self.graph, queued)
+        extra = [s for s in symbols if s.symbol_id in dependent_ids and s.kind != "module"]
+        if extra:
+            print(f"{len(extra)} direct dependents of changed symbols queued as well.")
+            skipped = [s for s in skipped if s.symbol_id not in dependent_ids]
+        return to_process + extra, skipped
+
+    def _select_within_budget(self, symbols: List[Symbol], contexts: Dict[str, str]) -> List[Symbol]:
+        """Longest prefix of ``symbols`` (priority order) whose estimated cost fits the token budget.
+        
+        The rest is reported as skipped for the budget. Reservations made while
+        generating still guard against estimates that turn out too low.
+        """
+        if not self.budget.limit:
+            return symbols
+        calls = CALLS_PER_SYMBOL.get(self.mode, STATIC_CALLS)
+        code_tokens = self._code_tokens(symbols)
+        remaining = self.budget.limit - self.budget.total
+        for i, sym in enumerate(symbols):
+            remaining -= self._estimate_cost(code_tokens.get(sym.symbol_id, 0), contexts.get(sym.symbol_id, ""), calls)
+            if remaining < 0:
+                self._budget_skipped.extend(symbols[i:])
+                return symbols[:i]
+        return symbols
+
+    def _dependency_waves(self, symbols: List[Symbol]) -> List[List[Symbol]]:
+        """Group symbols by dependency level (callees first), in file order inside a level.
+        
+        Priority has already decided what fits the budget (_select_within_budget),
+        so each wave runs file by file and the bounded SourceCache reads every
+        file once per wave instead of holding all sliced code for the run.
+        """
+        if not symbols:
+            return []
+        if not self.config.get("dependency_order", True):
+            return [sorted(symbols, key=lambda s: (s.file, s.start))]
+        levels = generation_levels(self.graph, [s.symbol_id for s in symbols])
+        waves: List[List[Symbol]] = [[] for _ in range(max(levels.values()) + 1)]
+        for sym in symbols:
+            waves[levels[sym.symbol_id]].append(sym)
+        return [sorted(w, key=lambda s: (s.file, s.start)) for w in waves if w]
+
+    def _callee_doc(self, symbol_id: str) -> Optional[str]:
+        """Docs of a callee: generated this run, else its existing section on disk."""
+        doc = self._generated_docs.get(symbol_id)
+        if doc is None:
+            sym = self.symbol_table.get(symbol_id)
+            if sym is None:
+                return None
+            target = self._target_file(sym)
+            if target not in self._page_docs:
+                self._page_docs[target] = read_section_contents(target)
+            doc = self._page_docs[target].get(symbol_id)
+        if not doc:
+            return None
+        if len(doc) > CALLEE_DOC_CHARS:
+            cut = doc.rfind("\n", 0, CALLEE_DOC_CHARS)
+            doc = doc[:cut if cut > 0 else CALLEE_DOC_CHARS] + "\n..."
+        return doc
+
+    def _add_callee_docs(self, wave: List[Symbol], contexts: Dict[str, str]):
+        """Append the docs of each symbol's callees to its retrieval context."""
+        limit = int(self.config.get("callee_docs", 5))
+        if limit <= 0:
+            return
+        for sym in wave:
+            parts = []
+            for callee in sorted(self.graph.successors(sym.symbol_id)):
+                doc = self._callee_doc(callee)
+                if doc:
+                    parts.append(f"### {callee}\n{doc}")
+                if len(parts) >= limit:
+                    break
+            if parts:
+                contexts[sym.symbol_id] = contexts.get(sym.symbol_id, "") + "\n\nDocumented callees:\n" + "\n\n".join(parts)
+
+    def _report_symbol_stats(self):
+        """Per-mode latency/token summary, plus a per-symbol CSV if `stats_file` is set."""
+        if not self._symbol_stats:
+            return
+        n = len(self._symbol_stats)
+        latencies = sorted(st.seconds for _, st in self._symbol_stats)
+        tokens = sum(st.prompt_tokens + st.completion_tokens for _, st in self._symbol_stats)
+        calls = sum(st.calls for _, st in self._symbol_stats)
+        print(f"Per symbol ({self.mode} mode): median {latencies[n // 2]:.2f}s, "
+              f"mean {sum(latencies) / n:.2f}s, {tokens / n:.0f} tokens, {calls / n:.1f} LLM calls")
+        
+        stats_file = self.config.get("stats_file")
+        if stats_file:
+            with open(stats_file, "w", newline="", encoding="utf-8") as f:
+                out = csv.writer(f)
+                out.writerow(["symbol_id", "mode", "seconds", "prompt_tokens", "completion_tokens", "llm_calls"])
+                for sym, st in self._symbol_stats:
+                    out.writerow([sym.symbol_id, self.mode, f"{st.seconds:.3f}",
+                                  st.prompt_tokens, st.completion_tokens, st.calls])
+            print(f"Wrote per-symbol stats to {stats_file}")
+
+    def _store_mismatch(self) -> Optional[str]:
+        """Why the store can't hold what the manifest lists, or None if it can."""
+        if not self.manifest.hashes:
+            return None
+        count = len(self.store)
+        if count != len(self.manifest.hashes):
+            return f"{count} vectors stored, {len(self.manifest.hashes)} in the manifest"
+        dim, dtype = self.store.stored_format()
+        if dim is not None and dim != self.manifest.dim:
+            return f"store dimension {dim}, manifest {self.manifest.dim}"
+        if dtype is not None and dtype != self.manifest.store_dtype:
+            return f"store dtype {dtype}, manifest {self.manifest.store_dtype}"
+        return None
+
+    def _embed_and_store(self, symbols: List[Symbol]) -> Dict[str, np.ndarray]:
+        """Embed symbols and upsert them into the store; returns their vectors."""
+        vectors = self.embedder.encode([_embed_text(s) for s in symbols])
+        metadatas = [
+            {
+                "symbol_id": s.symbol_id,
+                "qualname": s.qualname,
+                "file": s.file,
+                "hash": s.hash
+            }
+            for s in symbols
+        ]
+        self.store.add(vectors, metadatas)
+        return {s.symbol_id: v for s, v in zip(symbols, vectors)}
 
-    def _process_symbol_with_context(self, sym: Symbol):
-        """Helper to retrieve context and process symbol."""
-        # Retrieve context
-        query_vec = self.embedder.encode([sym.docstring or sym.qualname])
-        results = self.store.search(query_vec, k=3)
-        context_str = "\n".join([f"- {r['qualname']}" for r in results if r['qualname'] != sym.qualname])
+    def _gather_vectors(self, symbols: List[Symbol], vectors_by_id: Dict[str, np.ndarray]):
+        """Fill `vectors_by_id` for every symbol.
         
-        self._process_symbol(sym, context_str)
+        Vectors computed in the embed step are reused; only symbols that were
+        not re-embedded this run go through the store, then the (cached) embedder.
+        """
+        # Vectors of symbols indexed in an earlier run come straight from the store
+        missing = [s.symbol_id for s in symbols if s.symbol_id not in vectors_by_id]
+        if missing:
+            vectors_by_id.update(self.store.get_vectors(missing))
+        
+        missing = [s for s in symbols if s.symbol_id not in vectors_by_id]
+        if missing:
+            for s, v in zip(missing, self.embedder.encode([_embed_text(s) for s in missing])):
+                vectors_by_id[s.symbol_id] = v
+
+    def _update_neighbors(self, symbols: List[Symbol], vectors_by_id: Dict[str, np.ndarray]):
+        """Bring the k-NN table in line with the index; a no-op when nothing changed."""
+        ids = [s.symbol_id for s in symbols]
+        hashes = [s.hash for s in symbols]
+        if self.neighbors.is_current(ids, hashes):
+            return
+        
+        self._gather_vectors(symbols, vectors_by_id)
+        start = time.perf_counter()
+        recomputed = self.neighbors.update(
+            ids, hashes, np.vstack([vectors_by_id[sid] for sid in ids]),
+            max_block_bytes=int(self.config.get("knn_block_mb", 256)) << 20
+        )
+        print(f"Neighbour table: {recomputed}/{len(ids)} rows recomputed in {time.perf_counter() - start:.1f}s.")
+        self.neighbors.save()
+
+    def _retrieve_contexts(self, symbols: List[Symbol], vectors_by_id: Dict[str, np.ndarray], k: int = 3) -> Dict[str, str]:
+        """Build the related-symbols context for each symbol.
+        
+        Symbols covered by the precomputed neighbour table are answered from
+        it; the rest go through batched vector-store queries.
+        """
+        if not symbols:
+            return {}
+        
+        contexts = {}
+        if self.neighbors is not None:
+            for sym in symbols:
+                related = self.neighbors.get(sym.symbol_id, k)
+                if related:
+                    contexts[sym.symbol_id] = "\n".join(f"- {sid}" for sid, _ in related)
+            symbols = [s for s in symbols if s.symbol_id not in contexts]
+            if not symbols:
+                return contexts
+        
+        self._gather_vectors(symbols, vectors_by_id)
+        
+        print("Retrieving context...")
+        query_vecs = np.vstack([vectors_by_id[s.symbol_id] for s in symbols])
+        # Ask for one extra hit since the symbol usually finds itself first
+        all_results = self.store.search_batch(query_vecs, k=k + 1)
+        
+        for sym, results in zip(symbols, all_results):
+            related = [r['qualname'] for r in results if r['symbol_id'] != sym.symbol_id][:k]
+            contexts[sym.symbol_id] = "\n".join(f"- {q}" for q in related)
+        return contexts
+
+    def _target_file(self, sym: Symbol) -> Path:
+        """Docs page a symbol's section is written to."""
+        try:
+            rel_path = Path(sym.file).relative_to(self.root / "src").with_suffix(".md")
+        except ValueError:
+            rel_path = Path(sym.file).relative_to(self.root).with_suffix(".md")
+        return self.docs_root / "api" / rel_path
+
+    def _drop_up_to_date(self, symbols: List[Symbol]) -> Tuple[List[Symbol], List[Symbol]]:
+        """Split symbols into (stale, up to date) using the hash in each doc marker.
+        
+        Every page is scanned once; no LLM call is made for up-to-date symbols.
+        """
+        page_hashes: Dict[Path, Dict[str, str]] = {}
+        stale, fresh = [], []
+        for sym in symbols:
+            target = self._target_file(sym)
+            if target not in page_hashes:
+                page_hashes[target] = read_section_hashes(target)
+            if page_hashes[target].get(sym.symbol_id) == sym.hash:
+                fresh.append(sym)
+            else:
+                stale.append(sym)
+        return stale, fresh
+
+    def _code_tokens(self, symbols: List[Symbol]) -> Dict[str, int]:
+        """Estimated code tokens per symbol, reading files in order and keeping no text."""
+        tokens = {}
+        for sym in sorted(symbols, key=lambda s: (s.file, s.start)):
+            code = self._read_code(sym)
+            if code is not None:
+                tokens[sym.symbol_id] = estimate_tokens(code)
+        return tokens
 
-    def _process_symbol(self, sym: Symbol, context_str: str):
-        """Process a single symbol: generate docs, write."""
+    def _read_code(self, sym: Symbol) -> Optional[str]:
         try:
-            file_content = Path(sym.file).read_text(encoding="utf-8").splitlines()
-            code_segment = "\n".join(file_content[sym.start-1:sym.end])
+            return self.sources.segment(sym.file, sym.start, sym.end)
         except Exception as e:
             print(f"Failed to read code for {sym.qualname}: {e}")
-            return
+            return None
+
+    def _existing_docs(self, target_file: Path) -> str:
+        # Check for existing docs (ONLY in Agentic Mode)
+        if self.mode == "agentic" and target_file.exists():
+            return target_file.read_text(encoding="utf-8")
+        return ""
+
+    def _announce(self, sym: Symbol, target_file: Path, existing_content: str):
+        if existing_content:
+            print(f"  [Update] Updating existing docs for {sym.qualname}")
+        else:
+            action = "Create" if not target_file.exists() else "Overwrite"
+            print(f"  [{action}] Generating new docs for {sym.qualname}")
+
+    def _write(self, sym: Symbol, target_file: Path, markdown: str):
+        markdown = self.agents.clean_output(markdown)
+        # Callers in later dependency levels quote this
+        self._generated_docs[sym.symbol_id] = markdown
+        
+        # Write
+        if self.config.get("dry_run"):
+            # print(f"[Dry Run] Would write to {target_file}")
+            pass
+        else:
+            self.writer.stage_section(
+                file_path=target_file,
+                symbol_id=sym.symbol_id,
+                content=markdown,
+                source_hash=sym.hash
+            )
+
+    def _change_scores(self, symbols: List[Symbol], changed_ids: set) -> Dict[str, int]:
+        """How much changed around each symbol: itself (1) plus each of its changed direct callees.
+        
+        Old sources aren't kept, so the size of a symbol's own diff is unknown;
+        how many of the symbols it builds on moved is the measurable part.
+        """
+        scores = {}
+        for sym in symbols:
+            sid = sym.symbol_id
+            callees = self.graph.successors(sid) if sid in self.graph else ()
+            score = (sid in changed_ids) + sum(1 for c in callees if c in changed_ids)
+            if score:
+                scores[sid] = score
+        return scores
+
+    def _priority(self, sym: Symbol, change_scores: Dict[str, int]) -> Tuple:
+        """Sort key: public API first, then undocumented, then most changed since the last generate.
+        
+        Ties keep source order. Generation itself runs in file order within each
+        dependency wave (see _dependency_waves).
+        """
+        names = sym.qualname.split(".")[-2:] if sym.kind == "method" else [sym.qualname.split(".")[-1]]
+        private = any(n.startswith("_") and not n.endswith("__") for n in names)
+        return (private, bool(sym.docstring), -change_scores.get(sym.symbol_id, 0), sym.file, sym.start)
+
+    def _estimate_cost(self, code_tokens: int, context: str, calls: int) -> int:
+        per_call = code_tokens + estimate_tokens(context) + PROMPT_OVERHEAD_TOKENS + EST_COMPLETION_TOKENS
+        return per_call * calls
+
+    def _reserve_budget(self, syms: List[Symbol], estimate: int) -> Optional[int]:
+        """Reserve the estimated token cost of some work; None once the budget is spent.
+        
+        The first refusal stops every later symbol, so the run ends cleanly in
+        priority order instead of squeezing in whatever still fits.
+        """
+        if self._budget_exhausted or not self.budget.try_reserve(estimate):
+            self._budget_exhausted = True
+            self._budget_skipped.extend(syms)
+            return None
+        return estimate
+
+    def _process_symbol(self, sym: Symbol, context_str: str) -> bool:
+        """Process a single symbol: generate docs, write. Returns True on success."""
+        code_segment = self._read_code(sym)
+        if code_segment is None:
+            return False
+        estimate = self._estimate_cost(estimate_tokens(code_segment), context_str, CALLS_PER_SYMBOL.get(self.mode, STATIC_CALLS))
+        reserved = self._reserve_budget([sym], estimate)
+        if reserved is None:
+            return False
 
-        # Generate Analysis
         try:
-            if self.mode == "agentic":
-                analysis = self._run_agent_loop(code_segment, context_str)
-            else:
-                analysis = self.agents.analyze_code(code_segment, context_str)
-            
-            # Determine target file path FIRST
-            try:
-                rel_path = Path(sym.file).relative_to(self.root / "src").with_suffix(".md")
-            except ValueError:
-                rel_path = Path(sym.file).relative_to(self.root).with_suffix(".md")
-            
-            target_file = self.docs_root / "api" / rel_path
-            
-            # Check for existing docs (ONLY in Agentic Mode)
-            existing_content = ""
-            if self.mode == "agentic" and target_file.exists():
-                existing_content = target_file.read_text(encoding="utf-8")
-            
-            # Generate or Update
-            if existing_content:
-                print(f"  [Update] Updating existing docs for {sym.qualname}")
-                markdown = self.agents.update_docs(analysis, existing_content)
-            else:
-                action = "Create" if not target_file.exists() else "Overwrite"
-                print(f"  [{action}] Generating new docs for {sym.qualname}")
-                markdown = self.agents.generate_docs(analysis, "")
+            with track_usage() as stats:
+                target_file = self._target_file(sym)
+                if self.mode == "fused":
+                    # One call: code and context straight to markdown
+                    self._announce(sym, target_file, "")
+                    markdown = self.agents.fused_docs(code_segment, context_str)
+                else:
+                    # Generate Analysis
+                    if self.mode == "agentic":
+                        analysis = self._run_agent_loop(code_segment, context_str)
+                    else:
+                        analysis = self.agents.analyze_code(code_segment, context_str)
+                    
+                    existing_content = self._existing_docs(target_file)
+                    
+                    # Generate or Update
+                    self._announce(sym, target_file, existing_content)
+                    if existing_content:
+                        markdown = self.agents.update_docs(analysis, existing_content)
+                    else:
+                        markdown = self.agents.generate_docs(analysis, "")
             
-            markdown = self.agents.clean_output(markdown)
+            self._write(sym, target_file, markdown)
+            self._symbol_stats.append((sym, stats))
+            return True
+        except Exception as e:
+            print(f"Error processing {sym.qualname}: {e}")
+            return False
+        finally:
+            self.budget.release(reserved)
+
+    async def _aprocess_symbol(self, sym: Symbol, context_str: str) -> bool:
+        """Async twin of _process_symbol for the asyncio engine."""
+        code_segment = self._read_code(sym)
+        if code_segment is None:
+            return False
+        estimate = self._estimate_cost(estimate_tokens(code_segment), context_str, CALLS_PER_SYMBOL.get(self.mode, STATIC_CALLS))
+        reserved = self._reserve_budget([sym], estimate)
+        if reserved is None:
+            return False
+
+        try:
+            with track_usage() as stats:
+                target_file = self._target_file(sym)
+                if self.mode == "fused":
+                    self._announce(sym, target_file, "")
+                    markdown = await self.agents.afused_docs(code_segment, context_str)
+                else:
+                    if self.mode == "agentic":
+                        analysis = await self._arun_agent_loop(code_segment, context_str)
+                    else:
+                        analysis = await self.agents.aanalyze_code(code_segment, context_str)
+                    
+                    existing_content = self._existing_docs(target_file)
+                    
+                    self._announce(sym, target_file, existing_content)
+                    if existing_content:
+                        markdown = await self.agents.aupdate_docs(analysis, existing_content)
+                    else:
+                        markdown = await self.agents.agenerate_docs(analysis, "")
             
-            # Write
-            if self.config.get("dry_run"):
-                # print(f"[Dry Run] Would write to {target_file}")
-                pass
-            else:
-                self.writer.write_section(
-                    file_path=target_file,
-                    symbol_id=sym.symbol_id,
-                    content=markdown,
-                    source_hash=sym.hash
-                )
+            self._write(sym, target_file, markdown)
+            self._symbol_stats.append((sym, stats))
+            return True
         except Exception as e:
             print(f"Error processing {sym.qualname}: {e}")
+            return False
+        finally:
+            self.budget.release(reserved)
 
-    def _run_agent_loop(self, code: str, context: str) -> str:
-        """Orchestrator-managed ReAct loop."""
+    def _plan_units(self, symbols: List[Symbol]) -> List[List[Symbol]]:
+        """Split the work into units: single symbols, or batches of small symbols.
+        
+        With `batch_small_symbols`, functions/methods whose code is at most
+        `batch_symbol_max_tokens` are packed per (file, parent) into batches of up
+        to `batch_max_tokens` code tokens. Order follows the input order.
+        """
+        if not self.config.get("batch_small_symbols") or self.mode == "agentic":
+            return [[s] for s in symbols]
+        small_limit = int(self.config.get("batch_symbol_max_tokens", 200))
+        max_tokens = int(self.config.get("batch_max_tokens", 1500))
+        
+        units: List[List[Symbol]] = []
+        open_batches: Dict[Tuple[str, Optional[str]], Tuple[List[Symbol], int]] = {}
+        for sym in symbols:
+            code = self._read_code(sym)
+            size = estimate_tokens(code) if code is not None else small_limit + 1
+            if sym.kind not in ("function", "method") or size > small_limit:
+                units.append([sym])
+                continue
+            key = (sym.file, sym.parent)
+            batch, used = open_batches.get(key, (None, 0))
+            if batch is None or used + size > max_tokens:
+                batch, used = [], 0
+                units.append(batch)
+            batch.append(sym)
+            open_batches[key] = (batch, used + size)
+        return units
+
+    def _batch_inputs(self, unit: List[Symbol], contexts: Dict[str, str]) -> Tuple[List[Tuple[str, str]], str, int]:
+        """(symbol_id, code) items, merged context and token estimate for a batch."""
+        items = []
+        for sym in unit:
+            code = self._read_code(sym)
+            if code is None:
+                raise ValueError(f"cannot read {sym.qualname}")
+            items.append((sym.symbol_id, code))
+        lines = []
+        for sym in unit:
+            for line in contexts.get(sym.symbol_id, "").splitlines():
+                if line not in lines:
+                    lines.append(line)
+        context = "\n".join(lines)
+        code = "\n".join(c for _, c in items)
+        estimate = self._estimate_cost(estimate_tokens(code), context, 1) + EST_COMPLETION_TOKENS * (len(unit) - 1)
+        return items, context, estimate
+
+    def _write_batch(self, unit: List[Symbol], sections: Dict[str, str], stats: CallStats):
+        n = len(unit)
+        for sym in unit:
+            target_file = self._target_file(sym)
+            self._announce(sym, target_file, "")
+            self._write(sym, target_file, sections[sym.symbol_id])
+            # Each symbol gets an equal share of the batched call
+            self._symbol_stats.append((sym, CallStats(
+                prompt_tokens=stats.prompt_tokens // n,
+                completion_tokens=stats.completion_tokens // n,
+                calls=stats.calls / n,
+                seconds=stats.seconds
+            )))
+
+    def _process_unit(self, unit: List[Symbol], contexts: Dict[str, str]) -> int:
+        """Process a single symbol or a batch; returns how many symbols were written."""
+        if len(unit) == 1:
+            return int(self._process_symbol(unit[0], contexts.get(unit[0].symbol_id, "")))
+        
+        sections = None
+        try:
+            items, context, estimate = self._batch_inputs(unit, contexts)
+            reserved = self._reserve_budget(unit, estimate)
+            if reserved is None:
+                return 0
+            try:
+                with track_usage() as stats:
+                    sections = self.agents.batch_docs(items, context)
+            finally:
+                self.budget.release(reserved)
+            if sections is not None:
+                self._write_batch(unit, sections, stats)
+                return len(unit)
+        except Exception as e:
+            print(f"Batch of {len(unit)} symbols failed: {e}")
+        
+        if self._budget_exhausted:
+            return 0
+        print(f"  [Batch] Output did not split cleanly, retrying {len(unit)} symbols one by one")
+        return sum(int(self._process_symbol(sym, contexts.get(sym.symbol_id, ""))) for sym in unit)
+
+    async def _aprocess_unit(self, unit: List[Symbol], contexts: Dict[str, str]) -> int:
+        """Async twin of _process_unit."""
+        if len(unit) == 1:
+            return int(await self._aprocess_symbol(unit[0], contexts.get(unit[0].symbol_id, "")))
+        
+        sections = None
+        try:
+            items, context, estimate = self._batch_inputs(unit, contexts)
+            reserved = self._reserve_budget(unit, estimate)
+            if reserved is None:
+                return 0
+            try:
+                with track_usage() as stats:
+                    sections = await self.agents.abatch_docs(items, context)
+            finally:
+                self.budget.release(reserved)
+            if sections is not None:
+                self._write_batch(unit, sections, stats)
+                return len(unit)
+        except Exception as e:
+            print(f"Batch of {len(unit)} symbols failed: {e}")
+        
+        if self._budget_exhausted:
+            return 0
+        print(f"  [Batch] Output did not split cleanly, retrying {len(unit)} symbols one by one")
+        regenerated = 0
+        for sym in unit:
+            regenerated += int(await self._aprocess_symbol(sym, contexts.get(sym.symbol_id, "")))
+        return regenerated
+
+    async def _generate_async(self, units: List[List[Symbol]], contexts: Dict[str, str]) -> int:
+        """Run all work units on the event loop, at most `max_concurrency` in flight."""
+        semaphore = asyncio.Semaphore(max(1, int(self.config.get("max_concurrency", 64))))
+
+        async def bounded(unit: List[Symbol]) -> int:
+            async with semaphore:
+                return await self._aprocess_unit(unit, contexts)
+
+        regenerated = 0
+        tasks = [asyncio.ensure_future(bounded(unit)) for unit in units]
+        for next_done in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Generating docs", unit="task"):
+            try:
+                regenerated += await next_done
+            except Exception as e:
+                print(f"\nTask failed: {e}")
+        return regenerated
+
+    def _tool_prompt_parts(self) -> Tuple[str, str]:
         tool_names = ", ".join(self.tools.keys())
         tools_desc = "\n".join([f"- {name}: {tool.description}" for name, tool in self.tools.items()])
+        return tool_names, tools_desc
+
+    def _parse_agent_output(self, output: str) -> Tuple[Optional[str], Optional[Tuple[str, str]]]:
+        """Return (final answer, None), (None, (action, input)) or (None, None)."""
+        # Check for Final Answer
+        if "Final Answer:" in output:
+            return output.split("Final Answer:")[-1].strip(), None
+        
+        # Check for Action
+        action_match = re.search(r"Action:\s*(.*?)\nAction Input:\s*(.*)", output, re.DOTALL)
+        if action_match:
+            return None, (action_match.group(1).strip(), action_match.group(2).strip())
+        return None, None
+
+    def _run_tool(self, action: str, action_input: str) -> str:
+        # Execute tool (Orchestrator does this!), memoised for the rest of the run
+        from ..agent.tools import parse_tool_input
+        if action in self.tools:
+            print(f"  [Orchestrator] Executing tool {action} with '{action_input}'")
+            try:
+                return self.tool_memo.call(action, parse_tool_input(action_input), self.tools[action].invoke)
+            except Exception as e:
+                return f"Error: {e}"
+        return f"Error: Tool '{action}' not found. Available tools: {', '.join(self.tools.keys())}"
+
+    def _scratchpad_budget(self, code: str, context: str, tool_names: str, tools_desc: str) -> int:
+        """Tokens left for the scratchpad once prompt and completion fit in n_ctx."""
+        base = self.agents.agent_prompt_tokens(code, context, tool_names, tools_desc)
+        return max(0, int(self.config.get("n_ctx", 4096)) - base - AGENT_COMPLETION_RESERVE)
+
+    def _render_scratchpad(self, steps: List[Tuple[str, str]], max_tokens: int) -> str:
+        """Render (output, observation) steps, compacting older ones to fit `max_tokens`.
+        
+        First older observations are clipped, then the oldest steps are dropped,
+        and as a last resort the newest observation is clipped too.
+        """
+        def clip(obs: str, limit: int) -> str:
+            if len(obs) <= limit:
+                return obs
+            return obs[:limit] + f"\n... [{len(obs) - limit} chars omitted]"
+
+        def render(steps: List[Tuple[str, str]], old_limit: Optional[int], last_limit: Optional[int]) -> str:
+            parts = []
+            for i, (output, obs) in enumerate(steps):
+                limit = last_limit if i == len(steps) - 1 else old_limit
+                if limit is not None:
+                    obs = clip(obs, limit)
+                parts.append(f"{output}\nObservation: {obs}\nThought:")
+            return "".join(parts)
+
+        text = render(steps, None, None)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        
+        prefix = ""
+        while True:
+            text = prefix + render(steps, OLD_OBSERVATION_CHARS, None)
+            if estimate_tokens(text) <= max_tokens or len(steps) == 1:
+                break
+            steps = steps[1:]
+            prefix = "(earlier steps omitted)\n"
+        
+        if estimate_tokens(text) > max_tokens:
+            spare = max_tokens * CHARS_PER_TOKEN - len(prefix + render(steps, OLD_OBSERVATION_CHARS, 0))
+            text = prefix + render(steps, OLD_OBSERVATION_CHARS, max(0, spare))
+        return text
+
+    def _next_agent_step(self, output: str) -> Tuple[Optional[str], Optional[Tuple[str, str]], str]:
+        # Drop anything after a made-up observation, in case the backend ignored the stop sequence
+        output = output.split("\nObservation:")[0]
+        final, step = self._parse_agent_output(output)
+        return final, step, output
+
+    def _run_agent_loop(self, code: str, context: str) -> str:
+        """Orchestrator-managed ReAct loop."""
+        tool_names, tools_desc = self._tool_prompt_parts()
+        max_scratchpad = self._scratchpad_budget(code, context, tool_names, tools_desc)
+        stream = bool(self.config.get("agent_streaming", True))
         
-        scratchpad = ""
+        steps: List[Tuple[str, str]] = []
         
         # Limit iterations
         for i in range(5):
             # Ask Agent what to do
-            output = self.agents.ask_agent(code, context, scratchpad, tool_names, tools_desc)
+            scratchpad = self._render_scratchpad(steps, max_scratchpad)
+            output = self.agents.ask_agent(code, context, scratchpad, tool_names, tools_desc, stream=stream)
             
-            # Append to scratchpad
-            scratchpad += output
-            
-            # Check for Final Answer
-            if "Final Answer:" in output:
-                return output.split("Final Answer:")[-1].strip()
+            final, step, output = self._next_agent_step(output)
+            if final is not None:
+                return final
+            if step is None:
+                return output.strip()
             
-            # Check for Action
-            action_match = re.search(r"Action:\s*(.*?)\nAction Input:\s*(.*)", output, re.DOTALL)
-            if action_match:
-                action = action_match.group(1).strip()
-                action_input = action_match.group(2).strip()
-                
-                # Execute tool (Orchestrator does this!)
-                if action in self.tools:
-                    print(f"  [Orchestrator] Executing tool {action} with '{action_input}'")
-                    try:
-                        observation = self.tools[action].invoke(action_input)
-                    except Exception as e:
-                        observation = f"Error: {e}"
-                else:
-                    observation = f"Error: Tool '{action}' not found. Available tools: {tool_names}"
+            steps.append((output, self._run_tool(*step)))
                 
-                scratchpad += f"\nObservation: {observation}\nThought:"
-            else:
+        return "Error: Agent exceeded maximum iterations without a final answer."
+
+    async def _arun_agent_loop(self, code: str, context: str) -> str:
+        """Async ReAct loop; tools run in a thread so they don't block the event loop."""
+        tool_names, tools_desc = self._tool_prompt_parts()
+        max_scratchpad = self._scratchpad_budget(code, context, tool_names, tools_desc)
+        stream = bool(self.config.get("agent_streaming", True))
+        
+        steps: List[Tuple[str, str]] = []
+        
+        for i in range(5):
+            scratchpad = self._render_scratchpad(steps, max_scratchpad)
+            output = await self.agents.aask_agent(code, context, scratchpad, tool_names, tools_desc, stream=stream)
+            
+            final, step, output = self._next_agent_step(output)
+            if final is not None:
+                return final
+            if step is None:
                 return output.strip()
+            
+            steps.append((output, await asyncio.to_thread(self._run_tool, *step)))
                 
         return "Error: Agent exceeded maximum iterations without a final answer."
     
     def _cleanup(self):
         """Clean up resources on exit."""
+        if hasattr(self, 'writer') and self.writer:
+            try:
+                # Keep whatever was generated before an interruption
+                self.writer.flush()
+            except Exception:
+                pass
+        if getattr(self, 'agents', None) and self.agents.cache is not None:
+            try:
+                self.agents.cache.close()
+            except Exception:
+                pass
+        if hasattr(self, 'embedder') and self.embedder:
+            try:
+                self.embedder.close()
+            except Exception:
+                pass
         if hasattr(self, 'store') and self.store:
             try:
                 self.store.close()
-                print("Closed Qdrant connection.")
+                print("Closed vector store.")
             except Exception:
                 pass
     
@@ -1,50 +1,98 @@
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
+from collections import OrderedDict
 from pathlib import Path
-from langchain_core.tools import tool
-
-@tool
-def read_file(file_path: str) -> str:
-    """Read the content of a file.
-    
-    Args:
-        file_path: The absolute or relative path to the file.
-    """
-    try:
-        path = Path(file_path)
-        if not path.exists():
-            return f"Error: File {file_path} does not exist."
-        return path.read_text(encoding="utf-8")
-    except Exception as e:
-        return f"Error reading file: {e}"
-
-@tool
-def list_directory(dir_path: str = ".") -> str:
-    """List the contents of a directory.
-    
-    Args:
-        dir_path: The path to the directory. Defaults to current directory.
-    """
-    try:
-        path = Path(dir_path)
-        if not path.exists():
-            return f"Error: Directory {dir_path} does not exist."
-        
-        items = []
-        for item in path.iterdir():
-            prefix = "[DIR] " if item.is_dir() else "[FILE]"
-            items.append(f"{prefix} {item.name}")
-        return "\n".join(sorted(items))
-    except Exception as e:
-        return f"Error listing directory: {e}"
-
-@tool
-def search_code(query: str, root_dir: str = ".") -> str:
-    """Search for a string in all files in the directory.
-    
-    Args:
-        query: The string to search for.
-        root_dir: The directory to search in.
+import json
+import re
+import threading
+from langchain_core.tools import BaseTool, tool
+
+from ..index.neighbors import NeighborTable
+from ..index.symbol_table import SymbolTable
+from ..index.trigram import TrigramIndex
+from ..io.source_cache import SourceCache
+from ..parsing.discovery import IGNORE_DIRS
+from ..types import Symbol
+
+# Caps that keep a single observation well inside the context window
+MAX_OBSERVATION_CHARS = 6000
+MAX_READ_LINES = 200
+MAX_LIST_ENTRIES = 200
+MAX_LIST_DEPTH = 3
+MAX_SEMANTIC_RESULTS = 20
+MAX_SYMBOL_CANDIDATES = 10
+
+def clip_observation(text: str, max_chars: int = MAX_OBSERVATION_CHARS) -> str:
+    """Cut `text` to `max_chars`, saying how much was left out."""
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    if cut <= 0:
+        cut = max_chars
+    return text[:cut] + f"\n... [truncated, {len(text) - cut} more chars]"
+
+def parse_tool_input(action_input: str) -> Any:
+    """Agent "Action Input" -> tool input: a JSON object becomes keyword args, anything else a string."""
+    text = action_input.strip().strip("`").strip()
+    if text.startswith("{"):
+        try:
+            # Ignore anything the model wrote after the object
+            args, _ = json.JSONDecoder().raw_decode(text)
+            if isinstance(args, dict):
+                return args
+        except ValueError:
+            pass
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        text = text[1:-1]
+    return text
+
+class ToolMemo:
+    """Run-scoped, thread-safe LRU memo of tool observations keyed by (tool, input).
+
+    Workers documenting neighbouring symbols tend to read the same files and run
+    the same searches, so each distinct call is executed once per run.
     """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, max_entries)
+        self._results: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(name: str, tool_input: Any) -> Tuple[str, str]:
+        return name, json.dumps(tool_input, sort_keys=True, default=str)
+
+    def call(self, name: str, tool_input: Any, fn: Callable[[Any], str]) -> str:
+        key = self._key(name, tool_input)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+
+        # Run outside the lock; two workers racing on the same call just both compute it
+        result = fn(tool_input)
+        if not result.startswith("Error"):
+            with self._lock:
+                self._results[key] = result
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> str:
+        return f"Tool memo: {self.hits} hits, {self.misses} misses, {len(self._results)} entries"
+
+def _grep(query: str, root_dir: Path, max_chars: int) -> str:
+    """Fallback for search_code when no TrigramIndex is available."""
     try:
         import subprocess
         # Use grep to search recursively
@@ -52,21 +100,219 @@ def search_code(query: str, root_dir: str = ".") -> str:
         # -n: line numbers
         # -I: ignore binary files
         result = subprocess.run(
-            ["grep", "-rnI", query, root_dir],
+            ["grep", "-rnI", *[f"--exclude-dir={d}" for d in sorted(IGNORE_DIRS)], query, str(root_dir)],
             capture_output=True,
             text=True
         )
         if result.returncode != 0 and result.returncode != 1:
             return f"Error executing grep: {result.stderr}"
-        
+
         output = result.stdout
         if not output:
             return "No matches found."
-        
+
         # Limit output to avoid context window overflow
         lines = output.splitlines()
         if len(lines) > 50:
-            return "\n".join(lines[:50]) + f"\n... ({len(lines) - 50} more matches)"
-        return output
+            output = "\n".join(lines[:50]) + f"\n... ({len(lines) - 50} more matches)"
+        return clip_observation(output, max_chars)
     except Exception as e:
         return f"Error searching code: {e}"
+
+def make_tools(root: str = ".", sources: Optional[SourceCache] = None,
+               max_chars: int = MAX_OBSERVATION_CHARS,
+               search_index: Optional[TrigramIndex] = None,
+               symbols: Optional[SymbolTable] = None,
+               embedder=None, store=None, neighbors: Optional[NeighborTable] = None) -> Dict[str, BaseTool]:
+    """Build the agent tools, resolving relative paths against `root`.
+
+    File reads go through `sources` (the orchestrator's per-run line cache)
+    when given, and every observation is capped at `max_chars`. search_code
+    answers from `search_index` and only falls back to grep without one.
+    get_symbol/get_signature are added with a `symbols` table, and
+    semantic_search with an `embedder` and vector `store`, and similar_symbols
+    with a precomputed `neighbors` table.
+    """
+    base = Path(root)
+    sources = sources or SourceCache()
+
+    def resolve(p: str) -> Path:
+        path = Path(p)
+        return path if path.is_absolute() else base / path
+
+    def _display_path(file: str) -> str:
+        try:
+            return Path(file).relative_to(base).as_posix()
+        except ValueError:
+            return file
+
+    @tool
+    def read_file(file_path: str, start: int = 1, end: Optional[int] = None) -> str:
+        """Read lines of a file, numbered. Reads at most 200 lines per call.
+        Input is a path, or JSON like {"file_path": "src/pkg/mod.py", "start": 40, "end": 120} for a line range.
+        """
+        try:
+            path = resolve(file_path)
+            if not path.is_file():
+                return f"Error: File {file_path} does not exist."
+            lines = sources.lines(str(path))
+            start = max(1, int(start))
+            last = len(lines) if end is None else min(len(lines), int(end))
+            last = min(last, start + MAX_READ_LINES - 1)
+            if start > len(lines):
+                return f"Error: {file_path} has only {len(lines)} lines."
+            width = len(str(last))
+            text = "\n".join(f"{i:>{width}}| {lines[i - 1]}" for i in range(start, last + 1))
+            if last < len(lines):
+                text += f"\n... ({len(lines)} lines total; continue with start={last + 1})"
+            return clip_observation(text, max_chars)
+        except Exception as e:
+            return f"Error reading file: {e}"
+
+    @tool
+    def list_directory(dir_path: str = ".", depth: int = 1) -> str:
+        """List the contents of a directory, up to `depth` levels deep (max 3).
+        Input is a path, or JSON like {"dir_path": "src", "depth": 2}.
+        """
+        try:
+            path = resolve(dir_path)
+            if not path.is_dir():
+                return f"Error: Directory {dir_path} does not exist."
+            depth = max(1, min(int(depth), MAX_LIST_DEPTH))
+
+            lines = []
+            skipped = 0
+
+            def walk(current: Path, level: int):
+                nonlocal skipped
+                children = sorted(current.iterdir(), key=lambda p: (not p.is_dir(), p.name))
+                for child in children:
+                    is_dir = child.is_dir()
+                    if is_dir and (child.name in IGNORE_DIRS or child.name.endswith(".egg-info")):
+                        continue
+                    if len(lines) >= MAX_LIST_ENTRIES:
+                        skipped += 1
+                        continue
+                    prefix = "[DIR] " if is_dir else "[FILE]"
+                    lines.append(f"{'  ' * level}{prefix} {child.name}")
+                    if is_dir and level + 1 < depth:
+                        walk(child, level + 1)
+
+            walk(path, 0)
+            text = "\n".join(lines)
+            if skipped:
+                text += f"\n... ({skipped} more entries not shown)"
+            return clip_observation(text, max_chars)
+        except Exception as e:
+            return f"Error listing directory: {e}"
+
+    @tool
+    def search_code(query: str, root_dir: str = ".", regex: bool = False) -> str:
+        """Search the indexed source files for a string; returns file:line:text for each hit, definitions first.
+        Input is the string, or JSON like {"query": "def load.*path", "root_dir": "src", "regex": true}.
+        """
+        if search_index is None:
+            return _grep(query, resolve(root_dir), max_chars)
+        try:
+            under = str(resolve(root_dir))
+            hits, total = search_index.search(query, regex=regex, under=None if root_dir == "." else under)
+        except re.error as e:
+            return f"Error: invalid regex: {e}"
+        except Exception as e:
+            return f"Error searching code: {e}"
+        if not hits:
+            return "No matches found."
+        output = "\n".join(f"{_display_path(f)}:{n}:{line}" for f, n, line in hits)
+        if total > len(hits):
+            output += f"\n... ({total - len(hits)} more matches)"
+        return clip_observation(output, max_chars)
+
+    def lookup(qualname: str) -> Tuple[Optional[Symbol], str]:
+        matches = symbols.resolve(qualname)
+        if not matches:
+            return None, f"Error: No symbol named {qualname}."
+        if len(matches) > 1:
+            names = "\n".join(f"- {m.qualname}" for m in matches[:MAX_SYMBOL_CANDIDATES])
+            more = len(matches) - MAX_SYMBOL_CANDIDATES
+            return None, f"{qualname} is ambiguous, use one of:\n{names}" + (f"\n... ({more} more)" if more > 0 else "")
+        return matches[0], ""
+
+    def describe(sym: Symbol) -> str:
+        header = f"{sym.kind} {sym.qualname}"
+        if sym.signature:
+            header += sym.signature if sym.signature.startswith("(") else f" {sym.signature}"
+        return f"{header}  [{_display_path(sym.file)}:{sym.start}-{sym.end}]"
+
+    @tool
+    def get_symbol(qualname: str) -> str:
+        """Source code of a function, method or class by name, e.g. "pkg.mod.Class.method", "Class.method" or "helper"."""
+        try:
+            sym, error = lookup(qualname)
+            if sym is None:
+                return error
+            code = sources.segment(sym.file, sym.start, sym.end)
+            return clip_observation(f"{describe(sym)}\n{code}", max_chars)
+        except Exception as e:
+            return f"Error reading symbol: {e}"
+
+    @tool
+    def get_signature(qualname: str) -> str:
+        """Signature, location and docstring summary of a function, method or class by name (cheaper than get_symbol)."""
+        sym, error = lookup(qualname)
+        if sym is None:
+            return error
+        doc = (sym.docstring or "").strip().split("\n\n")[0]
+        return clip_observation(describe(sym) + (f"\n{doc}" if doc else ""), max_chars)
+
+    @tool
+    def semantic_search(query: str, k: int = 5) -> str:
+        """Find the symbols most related to a natural-language description (embedding search).
+        Input is the description, or JSON like {"query": "parse config file", "k": 5}.
+        """
+        try:
+            k = max(1, min(int(k), MAX_SEMANTIC_RESULTS))
+            hits = store.search(embedder.encode([query]), k=k)
+        except Exception as e:
+            return f"Error searching symbols: {e}"
+        if not hits:
+            return "No matches found."
+        lines = []
+        for i, hit in enumerate(hits, 1):
+            sym = symbols.get(hit["qualname"]) if symbols is not None else None
+            where = describe(sym) if sym is not None else f"{hit['qualname']}  [{_display_path(hit['file'])}]"
+            lines.append(f"{i}. {where}  (score {hit['score']:.2f})")
+        return clip_observation("\n".join(lines), max_chars)
+
+    @tool
+    def similar_symbols(qualname: str) -> str:
+        """Symbols whose code is most similar to the named one (precomputed, instant)."""
+        matches = symbols.resolve(qualname) if symbols is not None else []
+        sid = matches[0].symbol_id if len(matches) == 1 else qualname
+        related = neighbors.get(sid)
+        if not related:
+            return f"Error: No neighbours known for {qualname}."
+        lines = []
+        for i, (other, score) in enumerate(related, 1):
+            sym = symbols.get(other) if symbols is not None else None
+            lines.append(f"{i}. {describe(sym) if sym is not None else other}  (score {score:.2f})")
+        return clip_observation("\n".join(lines), max_chars)
+
+    tools = {
+        "read_file": read_file,
+        "list_directory": list_directory,
+        "search_code": search_code
+    }
+    if symbols is not None:
+        tools["get_symbol"] = get_symbol
+        tools["get_signature"] = get_signature
+    if embedder is not None and store is not None:
+        tools["semantic_search"] = semantic_search
+    if neighbors is not None:
+        tools["similar_symbols"] = similar_symbols
+    return tools
+
+# Default instances, relative to the working directory
+_DEFAULT_TOOLS = make_tools()
+read_file = _DEFAULT_TOOLS["read_file"]
+list_directory = _DEFAULT_TOOLS["list_directory"]
+search_code = _DEFAULT_TOOLS["search_code"]
@@ -10,31 +10,52 @@ def main():
 @click.option("--all", "all_", is_flag=True, help="Index entire repo")
 @click.option("--changed-only", is_flag=True, help="Index only changed files")
 @click.option("--root", default=".")
-def index(all_, changed_only, root):
-    """Parse and index codebase."""
+@click.option("--include", multiple=True, help="Glob of files to index, relative to root (repeatable)")
+@click.option("--exclude", multiple=True, help="Glob of files/dirs to skip, relative to root (repeatable)")
+@click.option("--discovery", type=click.Choice(["auto", "git", "walk"]), help="File discovery mode")
+@click.option("--neighbors", is_flag=True, help="Precompute and store the k nearest neighbours of every symbol")
+def index(all_, changed_only, root, include, exclude, discovery, neighbors):
+    """Parse and index codebase (no LLM, no docs written)."""
     from .config import settings
     
     # Override settings with CLI args if provided
     if root != ".":
         settings.root = root
+    if include:
+        settings.include = list(include)
+    if exclude:
+        settings.exclude = list(exclude)
+    if discovery:
+        settings.discovery = discovery
+    if neighbors:
+        settings.precompute_neighbors = True
         
     # Convert settings to dict for Orchestrator
     config = settings.dict()
     
     orch = Orchestrator(config)
-    orch.run(changed_only=changed_only)
+    orch.index()
 
 @main.command()
-@click.option("--changed-only", is_flag=True)
+@click.option("--changed-only", is_flag=True, help="Only symbols indexed as changed since the last generate")
 @click.option("--markdown", is_flag=True, default=True)
 @click.option("--dry-run", is_flag=True)
 @click.option("--write", is_flag=True)
 @click.option("--model", help="Model Name for API (e.g. qwen2.5-coder:latest)")
 @click.option("--api-base", help="API Base URL (default: http://localhost:11434/v1)")
 @click.option("--api-key", help="API Key (default: ollama)")
+@click.option("--model-path", type=click.Path(exists=True, dir_okay=False), help="Local GGUF model (uses llama.cpp instead of the API)")
+@click.option("--local-instances", type=int, help="Local model copies to load, bounded by free RAM (default: 1)")
 @click.option("--workers", type=int, default=4, help="Number of parallel workers")
-@click.option("--mode", type=click.Choice(["static", "agentic"]), default="static", help="Generation mode")
-def generate(changed_only, markdown, dry_run, write, model, api_base, api_key, workers, mode):
+@click.option("--mode", type=click.Choice(["static", "agentic", "fused"]), default="static", help="Generation mode")
+@click.option("--force", is_flag=True, help="Regenerate sections even if their source hash is unchanged")
+@click.option("--async", "async_", is_flag=True, help="Use the asyncio engine instead of worker threads")
+@click.option("--concurrency", type=int, help="Max in-flight symbols in async mode (default: 64)")
+@click.option("--no-cache", is_flag=True, help="Always call the LLM, bypassing the response cache")
+@click.option("--budget-tokens", type=int, help="Stop after this many LLM tokens (default 0 = unlimited)")
+@click.option("--stats-file", type=click.Path(dir_okay=False), help="Write per-symbol latency/token CSV here")
+@click.option("--batch-small", is_flag=True, help="Document small methods of a class/module in one request")
+def generate(changed_only, markdown, dry_run, write, model, api_base, api_key, model_path, local_instances, workers, mode, force, async_, concurrency, no_cache, budget_tokens, stats_file, batch_small):
     """Generate documentation."""
     from .config import settings
     
@@ -44,16 +65,33 @@ def generate(changed_only, markdown, dry_run, write, model, api_base, api_key, w
         settings.llm_api_base = api_base
     if api_key:
         settings.llm_api_key = api_key
+    if model_path:
+        settings.llm_backend = "local"
+        settings.llm_model_path = model_path
+    if local_instances:
+        settings.local_llm_instances = local_instances
     if workers:
         settings.max_workers = workers
     if mode:
         settings.mode = mode
+    if async_:
+        settings.async_generation = True
+    if concurrency:
+        settings.max_concurrency = concurrency
+    if no_cache:
+        settings.llm_cache = False
+    if budget_tokens is not None:
+        settings.budget_tokens = budget_tokens
+    if batch_small:
+        settings.batch_small_symbols = True
         
     config = settings.dict()
     config["dry_run"] = dry_run
+    config["force"] = force
+    config["stats_file"] = stats_file
     
     orch = Orchestrator(config)
-    orch.run(changed_only=changed_only)
+    orch.generate(changed_only=changed_only)
 
 if __name__ == "__main__":
     main()
@@ -1,23 +1,70 @@
 from pydantic_settings import BaseSettings
-from typing import Literal
+from typing import List, Literal, Optional
 
 class Settings(BaseSettings):
     root: str = "."
     src_root: str = "src"
     docs_root: str = "docs"
     embed_model: str = "intfloat/e5-base-v2"
+    embed_cache_size: int = 200_000  # max cached vectors (LRU eviction beyond)
+    embed_cache_dtype: str = "float32"  # "float32" or "float16"
+    embed_batch_size: int = 32  # max texts per embedding batch
+    embed_batch_tokens: int = 8192  # max padded tokens per batch (texts are bucketed by length)
+    embed_processes: int = 1  # > 1 encodes on a process pool, 0 = one per CPU core
+    llm_backend: str = "api"  # "api" (OpenAI-compatible server) or "local" (llama.cpp GGUF)
     llm_model_name: str = "qwen2.5-coder:latest"
+    llm_model_path: str = ""  # GGUF file for the local backend
+    local_llm_instances: int = 1  # model copies in RAM; calls beyond this queue up
+    local_prompt_cache_mb: int = 1024  # per-instance KV cache of earlier prompts, 0 = off
     llm_api_base: str = "http://localhost:11434/v1"
     llm_api_key: str = "ollama"
+    llm_cache: bool = True  # reuse responses for byte-identical prompts across runs
+    llm_cache_size: int = 50_000  # max cached responses (LRU eviction beyond)
+
+    # Vector store (storage options apply when the collection is created)
+    vector_store: Literal["qdrant", "numpy"] = "qdrant"  # "numpy": memory-mapped matrix, exact search, no locks
+    numpy_store_dtype: str = "float32"  # "float32" or "float16" rows in the numpy store
+    qdrant_url: str = ""  # Qdrant server; empty = embedded store under root/.qdrant
+    qdrant_quantization: str = ""  # "" or "int8" (scalar quantisation)
+    qdrant_on_disk: bool = False  # keep original vectors on disk instead of RAM
+    qdrant_on_disk_payload: bool = False
+    qdrant_hnsw_m: Optional[int] = None  # HNSW edges per node (server default 16)
+    qdrant_hnsw_ef_construct: Optional[int] = None  # build-time beam width (default 100)
+    qdrant_search_ef: Optional[int] = None  # search-time beam width
+    qdrant_upsert_batch_size: int = 256
 
     k: int = 8
     max_workers: int = 4
-    budget_tokens: int = 200_000
+    async_generation: bool = False  # drive the LLM via asyncio instead of threads
+    max_concurrency: int = 64  # in-flight LLM chains in async mode
+    parse_workers: int = 0  # processes for parsing, 0 = one per CPU core
+    parse_chunk_size: int = 64  # files per parsing task
+    precompute_neighbors: bool = False  # whole-repo k-NN table (k neighbours each) built at index time
+    knn_block_mb: int = 256  # memory for one block of the k-NN score matrix
+    budget_tokens: int = 0  # cap on prompt + completion tokens per run, 0 = unlimited
     n_ctx: int = 4096
     n_gpu_layers: int = 0
     
+    # File discovery
+    discovery: str = "auto"  # "auto", "git" (git ls-files) or "walk"
+    include: List[str] = []  # globs relative to root, e.g. ["src/**"]
+    exclude: List[str] = []  # globs relative to root, e.g. ["tests/", "**/vendor/**"]
+    
     # Agent Mode
-    mode: str = "static"  # "static" or "agentic"
+    mode: str = "static"  # "static", "agentic" or "fused" (one LLM call per symbol)
+    agent_streaming: bool = True  # act on a ReAct tool call as soon as it is streamed
+    max_observation_chars: int = 6000  # cap on one tool result (also limited to n_ctx / 4)
+    tool_memo_size: int = 1024  # distinct tool calls memoised per run
+    
+    # Dependency graph (imports and calls)
+    dependency_order: bool = True  # document callees before their callers
+    propagate_changes: bool = True  # re-document direct callers of changed symbols
+    callee_docs: int = 5  # callee sections quoted in a symbol's context, 0 = off
+    
+    # Pack small functions/methods of one class or module into a single request
+    batch_small_symbols: bool = False
+    batch_symbol_max_tokens: int = 200  # symbols up to this size are batched
+    batch_max_tokens: int = 1500  # code tokens per batched request
 
     class Config:
         env_file = ".env"
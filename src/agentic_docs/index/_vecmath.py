@@ -0,0 +1,21 @@
+"""Vector helpers shared by the neighbour table and the NumPy vector store."""
+from typing import Tuple
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length, as float32; all-zero rows stay zero."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores: np.ndarray, idx: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best ``k`` columns per row of ``scores`` (descending), with the matching ``idx`` entries."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        idx = np.take_along_axis(idx, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(scores, order, axis=1)
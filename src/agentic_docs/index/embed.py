@@ -1,5 +1,8 @@
 """Embedding interface using sentence-transformers."""
-from typing import List
+from pathlib import Path
+from typing import List, Optional
+import os
+import threading
 import numpy as np
 try:
     from sentence_transformers import SentenceTransformer
@@ -7,33 +10,136 @@ except ImportError:
     SentenceTransformer = None
 
 class Embedder:
-    def __init__(self, model_name: str = "intfloat/e5-base-v2", device: str = "cpu"):
+    def __init__(
+        self,
+        model_name: str = "intfloat/e5-base-v2",
+        device: str = "cpu",
+        cache_dir: Optional[Path] = None,
+        cache_size: int = 200_000,
+        cache_dtype: str = "float32",
+        batch_size: int = 32,
+        batch_tokens: int = 8192,
+        processes: int = 1,
+    ):
+        """
+        batch_size/batch_tokens: texts are bucketed by token length and each
+        batch holds at most `batch_size` texts and `batch_tokens` padded tokens,
+        so short texts go in large batches and long ones don't pad short ones.
+        processes: > 1 spreads encoding over a pool of worker processes
+        (0 = one per CPU core); the pool starts on first use.
+        """
         if SentenceTransformer is None:
             raise ImportError("sentence-transformers not installed")
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name, device=device)
+        self.device = device
+        self.batch_size = max(1, batch_size)
+        self.batch_tokens = max(1, batch_tokens)
+        self.processes = processes if processes > 0 else (os.cpu_count() or 1)
+        self._pool = None
+        
+        # Persistent cache if a directory is given, in-process dict otherwise
+        self._disk_cache = None
         self._cache = {}
+        self._cache_lock = threading.Lock()
+        if cache_dir is not None:
+            from .embed_cache import EmbeddingCache
+            self._disk_cache = EmbeddingCache(
+                cache_dir, model_name, self.dim, max_entries=cache_size, dtype=cache_dtype
+            )
+
+    @property
+    def dim(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _lookup(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        if self._disk_cache is not None:
+            return self._disk_cache.get_many(texts)
+        with self._cache_lock:
+            return [self._cache.get(t) for t in texts]
+
+    def _store(self, texts: List[str], vectors: np.ndarray):
+        if self._disk_cache is not None:
+            self._disk_cache.put_many(texts, vectors)
+            return
+        with self._cache_lock:
+            for t, v in zip(texts, vectors):
+                self._cache[t] = v
 
     def encode(self, texts: List[str]) -> np.ndarray:
-        # Simple in-memory cache for now
-        # In production, use a persistent cache (disk/redis)
-        to_encode = []
-        indices = []
-        results = [None] * len(texts)
-
-        for i, text in enumerate(texts):
-            if text in self._cache:
-                results[i] = self._cache[text]
-            else:
-                to_encode.append(text)
-                indices.append(i)
+        results = self._lookup(texts)
+        
+        # Encode each missing text once, even if it repeats within the batch
+        missing = {}
+        for i, vec in enumerate(results):
+            if vec is None:
+                missing.setdefault(texts[i], []).append(i)
         
-        if to_encode:
+        if missing:
             # e5 models need "query: " or "passage: " prefix usually, 
             # but for code we might just use raw or "passage: "
             # For now, assuming raw usage or user handles prefix
-            embeddings = self.model.encode(to_encode, convert_to_numpy=True)
-            for idx, emb in zip(indices, embeddings):
-                self._cache[texts[idx]] = emb
-                results[idx] = emb
+            to_encode = list(missing)
+            embeddings = self._encode_uncached(to_encode)
+            self._store(to_encode, embeddings)
+            for text, emb in zip(to_encode, embeddings):
+                for idx in missing[text]:
+                    results[idx] = emb
                 
         return np.vstack(results)
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        tokenizer = getattr(self.model, "tokenizer", None)
+        max_len = self.model.get_max_seq_length() or 512
+        if tokenizer is None:
+            # Rough fallback: ~4 characters per token
+            return [min(max_len, len(t) // 4 + 2) for t in texts]
+        ids = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_len)["input_ids"]
+        return [len(i) for i in ids]
+
+    def _buckets(self, lengths: List[int]) -> List[List[int]]:
+        """Indices grouped into batches of similar token length (shortest first)."""
+        batches, batch = [], []
+        for i in np.argsort(lengths, kind="stable").tolist():
+            # Sorted ascending, so the newest text is the longest and sets the padding
+            if batch and (len(batch) == self.batch_size or lengths[i] * (len(batch) + 1) > self.batch_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _encode_uncached(self, texts: List[str]) -> np.ndarray:
+        """Encode in length buckets (on the process pool if enabled); rows follow `texts`."""
+        batches = self._buckets(self._token_lengths(texts))
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        
+        # A pool only pays off once every worker gets a few batches
+        if self.processes > 1 and len(texts) >= self.processes * self.batch_size:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(target_devices=[self.device] * self.processes)
+            order = [i for batch in batches for i in batch]
+            out[order] = self.model.encode_multi_process(
+                [texts[i] for i in order], self._pool, batch_size=self.batch_size,
+                chunk_size=max(self.batch_size, len(texts) // (self.processes * 4))
+            )
+            return out
+        
+        for batch in batches:
+            out[batch] = self.model.encode(
+                [texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True
+            )
+        return out
+
+    def close(self):
+        """Flush the cache and stop the worker pool, if one was started."""
+        self.flush()
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def flush(self):
+        """Persist the on-disk cache index, if any."""
+        if self._disk_cache is not None:
+            self._disk_cache.flush()
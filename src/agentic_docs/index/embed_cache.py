@@ -0,0 +1,181 @@
+"""Persistent, memory-mapped embedding cache."""
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Share of entries dropped at once when the cache is full, so eviction
+# (and the index rewrite it triggers) doesn't happen on every insert.
+EVICT_FRACTION = 0.1
+MIN_CAPACITY = 1024
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """Key for a (model, text) pair: first 128 bits of sha256, hex encoded."""
+    h = hashlib.sha256(model_name.encode("utf-8") + b"\0" + text.encode("utf-8"))
+    return h.hexdigest()[:32].encode("ascii")
+
+
+class EmbeddingCache:
+    """On-disk vector cache keyed by (model name, sha of the text).
+
+    Layout under ``cache_dir/<model slug>/``:
+
+    - ``vectors.npy``: memory-mapped ``(capacity, dim)`` array of float32/float16
+    - ``keys.npy`` / ``slots.npy`` / ``ticks.npy``: the compact key index
+      (key digest, row in ``vectors.npy``, last-use tick for LRU eviction)
+
+    All public methods are guarded by a lock so worker threads can share one
+    instance.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        model_name: str,
+        dim: int,
+        max_entries: int = 200_000,
+        dtype: str = "float32",
+    ):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported cache dtype: {dtype}")
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max(1, max_entries)
+        self.dtype = np.dtype(dtype)
+        self.dir = Path(cache_dir) / model_name.replace("/", "__")
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}  # key -> slot
+        self._ticks: Dict[bytes, int] = {}  # key -> last use
+        self._free: List[int] = []
+        self._tick = 0
+        self._dirty = False
+        self._vectors: Optional[np.memmap] = None
+
+        self._load()
+
+    # -- persistence -------------------------------------------------------
+
+    def _path(self, name: str) -> Path:
+        return self.dir / name
+
+    def _load(self):
+        vec_path = self._path("vectors.npy")
+        if vec_path.exists():
+            try:
+                vectors = np.load(vec_path, mmap_mode="r+")
+                if vectors.shape[1] != self.dim or vectors.dtype != self.dtype:
+                    raise ValueError("dimension or dtype mismatch")
+                keys = np.load(self._path("keys.npy"))
+                slots = np.load(self._path("slots.npy"))
+                ticks = np.load(self._path("ticks.npy"))
+                self._vectors = vectors
+                for k, s, t in zip(keys.tolist(), slots.tolist(), ticks.tolist()):
+                    self._index[k] = s
+                    self._ticks[k] = t
+                self._tick = int(ticks.max()) if len(ticks) else 0
+            except Exception as e:
+                print(f"Discarding embedding cache at {self.dir}: {e}")
+                self._vectors = None
+                self._index.clear()
+                self._ticks.clear()
+
+        if self._vectors is None:
+            self._vectors = self._allocate(min(MIN_CAPACITY, self.max_entries))
+            self._dirty = True
+
+        used = set(self._index.values())
+        self._free = [i for i in range(len(self._vectors) - 1, -1, -1) if i not in used]
+
+    def _allocate(self, capacity: int) -> np.memmap:
+        tmp = self._path("vectors.npy.tmp")
+        arr = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.dtype, shape=(capacity, self.dim))
+        if self._vectors is not None:
+            arr[: len(self._vectors)] = self._vectors
+        arr.flush()
+        del arr
+        os.replace(tmp, self._path("vectors.npy"))
+        return np.load(self._path("vectors.npy"), mmap_mode="r+")
+
+    def _save_array(self, name: str, arr: np.ndarray):
+        tmp = self._path(name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, self._path(name))
+
+    def _flush_locked(self):
+        self._vectors.flush()
+        keys = list(self._index.keys())
+        self._save_array("keys.npy", np.array(keys, dtype="S32"))
+        self._save_array("slots.npy", np.array([self._index[k] for k in keys], dtype=np.int64))
+        self._save_array("ticks.npy", np.array([self._ticks[k] for k in keys], dtype=np.int64))
+        self._dirty = False
+
+    def flush(self):
+        """Persist the key index (vectors are written through the memmap)."""
+        with self._lock:
+            if self._dirty:
+                self._flush_locked()
+
+    # -- lookup / insert ---------------------------------------------------
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return cached vectors (as float32 copies) or None for each text."""
+        out: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for text in texts:
+                key = cache_key(self.model_name, text)
+                slot = self._index.get(key)
+                if slot is None:
+                    out.append(None)
+                    continue
+                self._tick += 1
+                self._ticks[key] = self._tick
+                self._dirty = True
+                out.append(np.array(self._vectors[slot], dtype=np.float32))
+        return out
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Insert vectors, evicting least recently used entries when full.
+
+        New keys become durable on the next ``flush()``.
+        """
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                key = cache_key(self.model_name, text)
+                slot = self._index.get(key)
+                if slot is None:
+                    slot = self._take_slot()
+                    self._index[key] = slot
+                self._tick += 1
+                self._ticks[key] = self._tick
+                self._vectors[slot] = vec
+            self._dirty = True
+
+    def _take_slot(self) -> int:
+        if not self._free:
+            if len(self._vectors) < self.max_entries:
+                old = len(self._vectors)
+                self._vectors = self._allocate(min(old * 2, self.max_entries))
+                self._free = list(range(len(self._vectors) - 1, old - 1, -1))
+            else:
+                self._evict()
+        return self._free.pop()
+
+    def _evict(self):
+        n = max(1, int(len(self._index) * EVICT_FRACTION))
+        victims = sorted(self._ticks, key=self._ticks.get)[:n]
+        for key in victims:
+            self._free.append(self._index.pop(key))
+            del self._ticks[key]
+        # Persist the shrunken index before the freed rows get overwritten,
+        # so a crash can never map an old key to a new vector.
+        self._flush_locked()
+
+    def __len__(self) -> int:
+        return len(self._index)
@@ -0,0 +1,96 @@
+"""Persisted symbol manifest for incremental indexing."""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..types import Symbol
+
+MANIFEST_VERSION = 1
+
+
+class SymbolManifest:
+    """Tracks which symbol hashes are currently stored in the vector index.
+
+    The manifest maps ``symbol_id -> hash`` and records the embedding model,
+    dimension and store dtype it was built with. If any of them changes, every
+    symbol is treated as new so the index is rebuilt with consistent vectors.
+
+    ``pending`` holds the ids indexed as new or changed since docs were last
+    generated for them, so ``generate --changed-only`` still sees changes a
+    separate ``index`` run (e.g. in CI) already recorded.
+    """
+
+    def __init__(self, path: Path, model_name: str, dim: int, store_dtype: str = "float32"):
+        self.path = Path(path)
+        self.model_name = model_name
+        self.dim = dim
+        self.store_dtype = store_dtype
+        self.hashes: Dict[str, str] = {}
+        self.pending: Set[str] = set()
+        self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"Ignoring unreadable manifest {self.path}: {e}")
+            return
+
+        if (
+            data.get("version") != MANIFEST_VERSION
+            or data.get("model") != self.model_name
+            or data.get("dim") != self.dim
+            or data.get("store_dtype", "float32") != self.store_dtype
+        ):
+            print("Embedding model or store format changed since last index, re-indexing everything.")
+            return
+        self.hashes = dict(data.get("symbols", {}))
+        self.pending = set(data.get("pending", []))
+
+    def save(self):
+        """Write the manifest atomically (temp file + rename)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "model": self.model_name,
+            "dim": self.dim,
+            "store_dtype": self.store_dtype,
+            "symbols": self.hashes,
+            "pending": sorted(self.pending),
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        """Forget every stored hash, e.g. when the store turned out to be empty."""
+        self.hashes = {}
+
+    def changed(self, symbols: List[Symbol]) -> List[Symbol]:
+        """Symbols that are new or whose hash differs from the stored one."""
+        return [s for s in symbols if self.hashes.get(s.symbol_id) != s.hash]
+
+    def removed(self, symbols: List[Symbol]) -> List[str]:
+        """Ids in the manifest that no longer appear in ``symbols``."""
+        current = {s.symbol_id for s in symbols}
+        return [sid for sid in self.hashes if sid not in current]
+
+    def diff(self, symbols: List[Symbol]) -> Tuple[List[Symbol], List[str]]:
+        """Return (new or changed symbols, ids of symbols that disappeared)."""
+        return self.changed(symbols), self.removed(symbols)
+
+    def update(self, symbols: List[Symbol], removed: Optional[List[str]] = None):
+        for s in symbols:
+            self.hashes[s.symbol_id] = s.hash
+        for sid in removed or []:
+            self.hashes.pop(sid, None)
+            self.pending.discard(sid)
+
+    def mark_pending(self, symbol_ids: Iterable[str]):
+        self.pending.update(symbol_ids)
+
+    def clear_pending(self, symbol_ids: Iterable[str]):
+        self.pending.difference_update(symbol_ids)
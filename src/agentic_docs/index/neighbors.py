@@ -0,0 +1,176 @@
+"""Whole-repo k-nearest-neighbour table, computed with blocked matrix products."""
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ._vecmath import normalize, top_k
+
+NEIGHBOR_TABLE_VERSION = 1
+
+
+def knn(vectors: np.ndarray, k: int, rows: Optional[np.ndarray] = None,
+        max_block_bytes: int = 256 << 20) -> Tuple[np.ndarray, np.ndarray]:
+    """Cosine top-``k`` neighbours of ``vectors[rows]`` among all ``vectors``, self excluded.
+
+    Queries are processed in blocks so the score matrix never exceeds
+    ``max_block_bytes``. Returns ``(indices, scores)``, both ``(len(rows), k)``.
+    """
+    unit = normalize(vectors)
+    n = len(unit)
+    rows = np.arange(n) if rows is None else np.asarray(rows, dtype=np.int64)
+    k = min(k, n - 1)
+    if k <= 0 or not len(rows):
+        return np.empty((len(rows), 0), dtype=np.int32), np.empty((len(rows), 0), dtype=np.float32)
+
+    # Scores plus argpartition's index array, per query row
+    block = max(1, min(len(rows), max_block_bytes // (n * 12)))
+    out_idx = np.empty((len(rows), k), dtype=np.int32)
+    out_scores = np.empty((len(rows), k), dtype=np.float32)
+    all_idx = np.arange(n, dtype=np.int32)
+    for start in range(0, len(rows), block):
+        q = rows[start:start + block]
+        scores = unit[q] @ unit.T
+        scores[np.arange(len(q)), q] = -np.inf  # a symbol is not its own neighbour
+        idx, best = top_k(scores, np.broadcast_to(all_idx, scores.shape), k)
+        out_idx[start:start + len(q)] = idx
+        out_scores[start:start + len(q)] = best
+    return out_idx, out_scores
+
+
+class NeighborTable:
+    """Persisted ``symbol_id -> [(neighbour id, score), ...]`` for every indexed symbol.
+
+    Rows are keyed by (symbol id, source hash). ``update`` reuses the stored
+    table: rows of new or changed symbols are recomputed against everything,
+    the other rows only score the changed symbols and merge them into their
+    list. A row that lost a neighbour (removed or changed) is recomputed in
+    full, so the result is always exact.
+    """
+
+    def __init__(self, path: Optional[Path], model_name: str, k: int = 8):
+        self.path = Path(path) if path else None
+        self.model_name = model_name
+        self.k = k
+        self.ids: List[str] = []
+        self.hashes: List[str] = []
+        self.neighbors = np.empty((0, 0), dtype=np.int32)
+        self.scores = np.empty((0, 0), dtype=np.float32)
+        self._row: Dict[str, int] = {}
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _reindex(self):
+        self._row = {sid: i for i, sid in enumerate(self.ids)}
+
+    def is_current(self, ids: Sequence[str], hashes: Sequence[str]) -> bool:
+        return list(ids) == self.ids and list(hashes) == self.hashes
+
+    def get(self, symbol_id: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Neighbours of a symbol, best first; empty if it is not in the table."""
+        i = self._row.get(symbol_id)
+        if i is None:
+            return []
+        cols = self.neighbors.shape[1] if k is None else min(k, self.neighbors.shape[1])
+        return [(self.ids[j], float(s)) for j, s in zip(self.neighbors[i, :cols], self.scores[i, :cols])]
+
+    def update(self, ids: List[str], hashes: List[str], vectors: np.ndarray,
+               max_block_bytes: int = 256 << 20) -> int:
+        """Bring the table in line with the given symbols; returns how many rows were fully recomputed."""
+        n = len(ids)
+        k = min(self.k, max(n - 1, 0))
+        old_row = {sid: i for i, sid in enumerate(self.ids)}
+        old_hash = dict(zip(self.ids, self.hashes))
+        unchanged = np.array([old_hash.get(sid) == h for sid, h in zip(ids, hashes)], dtype=bool)
+
+        if self.neighbors.shape[1] != k or not unchanged.any():
+            neighbors, scores = knn(vectors, k, max_block_bytes=max_block_bytes)
+            recomputed = n
+        else:
+            neighbors = np.empty((n, k), dtype=np.int32)
+            scores = np.empty((n, k), dtype=np.float32)
+
+            # Old neighbour lists in new row numbers; -1 where the neighbour is gone or changed
+            new_pos = np.full(len(self.ids) + 1, -1, dtype=np.int64)
+            for i, sid in enumerate(ids):
+                j = old_row.get(sid)
+                if j is not None and unchanged[i]:
+                    new_pos[j] = i
+            keep = np.flatnonzero(unchanged)
+            mapped = new_pos[self.neighbors[[old_row[ids[i]] for i in keep]]]
+            intact = (mapped >= 0).all(axis=1)
+
+            merge_rows = keep[intact]
+            full_rows = np.concatenate([np.flatnonzero(~unchanged), keep[~intact]])
+            changed = np.flatnonzero(~unchanged)
+
+            if len(merge_rows):
+                old_scores = self.scores[[old_row[ids[i]] for i in merge_rows]]
+                old_idx = mapped[intact]
+                if len(changed):
+                    unit = normalize(vectors)
+                    block = max(1, max_block_bytes // (max(len(changed), 1) * 12))
+                    for start in range(0, len(merge_rows), block):
+                        rows = merge_rows[start:start + block]
+                        cand_scores = np.hstack([old_scores[start:start + len(rows)], unit[rows] @ unit[changed].T])
+                        cand_idx = np.hstack([old_idx[start:start + len(rows)],
+                                              np.broadcast_to(changed, (len(rows), len(changed)))])
+                        neighbors[rows], scores[rows] = top_k(cand_scores, cand_idx, k)
+                else:
+                    neighbors[merge_rows] = old_idx
+                    scores[merge_rows] = old_scores
+            if len(full_rows):
+                neighbors[full_rows], scores[full_rows] = knn(
+                    vectors, k, rows=full_rows, max_block_bytes=max_block_bytes
+                )
+            recomputed = len(full_rows)
+
+        self.ids, self.hashes = list(ids), list(hashes)
+        self.neighbors, self.scores = neighbors.astype(np.int32), scores.astype(np.float32)
+        self._reindex()
+        return recomputed
+
+    # -- persistence -------------------------------------------------------
+
+    def load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with np.load(self.path) as data:
+                if (
+                    int(data["version"]) != NEIGHBOR_TABLE_VERSION
+                    or str(data["model"]) != self.model_name
+                    or int(data["k"]) != self.k
+                ):
+                    return
+                self.ids = data["ids"].tolist()
+                self.hashes = data["hashes"].tolist()
+                self.neighbors = data["neighbors"]
+                self.scores = data["scores"]
+        except Exception as e:
+            print(f"Ignoring unreadable neighbour table {self.path}: {e}")
+            self.ids, self.hashes = [], []
+            self.neighbors = np.empty((0, 0), dtype=np.int32)
+            self.scores = np.empty((0, 0), dtype=np.float32)
+        self._reindex()
+
+    def save(self):
+        """Write the table atomically (temp file + rename)."""
+        if self.path is None:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                version=np.array(NEIGHBOR_TABLE_VERSION),
+                model=np.array(self.model_name),
+                k=np.array(self.k),
+                ids=np.array(self.ids, dtype=str),
+                hashes=np.array(self.hashes, dtype=str),
+                neighbors=self.neighbors,
+                scores=self.scores,
+            )
+        os.replace(tmp, self.path)
@@ -0,0 +1,272 @@
+"""In-process vector store: a memory-mapped matrix searched exactly with NumPy."""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ._vecmath import normalize, top_k
+
+NUMPY_STORE_VERSION = 1
+MIN_CAPACITY = 1024
+# Rewrite the matrix without deleted rows once they make up this share of it
+COMPACT_FRACTION = 0.25
+
+
+class NumpyStore:
+    """Drop-in alternative to ``QdrantStore`` for small and medium repositories.
+
+    Layout under ``index_path``:
+
+    - ``vectors.npy``: memory-mapped ``(capacity, dim)`` matrix of unit-length
+      float32/float16 rows
+    - ``payloads.json``: one payload per used row (``null`` for deleted rows);
+      rows beyond its length are unused capacity
+
+    Search is an exact cosine top-k over all live rows, in blocks of rows so
+    memory stays bounded. There is no lock file: a single writer appends rows
+    and overwrites a symbol's own row in place, while growth and compaction
+    write a new matrix and rename it over the old one, so processes opened
+    with ``read_only=True`` keep a consistent snapshot (``load`` picks up the
+    writer's latest ``save``).
+    """
+
+    def __init__(self, index_path: Optional[Path] = None, dim: int = 768, dtype: str = "float32",
+                 read_only: bool = False, max_block_bytes: int = 64 << 20):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported store dtype: {dtype}")
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.read_only = read_only
+        self.max_block_bytes = max_block_bytes
+        self.index_path = Path(index_path) if index_path else Path("./vector_store")
+        if not read_only:
+            self.index_path.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._payloads: List[Optional[Dict[str, Any]]] = []
+        self._live = np.zeros(0, dtype=bool)
+        self._row: Dict[str, int] = {}  # symbol_id -> row
+        self._dirty = False
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+    def stored_format(self) -> Tuple[Optional[int], Optional[str]]:
+        """(dimension, dtype) of the loaded matrix; (None, None) when nothing is loaded."""
+        if self._vectors is None:
+            return None, None
+        return self._vectors.shape[1], str(self._vectors.dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # -- persistence -------------------------------------------------------
+
+    def _path(self, name: str) -> Path:
+        return self.index_path / name
+
+    def _capacity(self) -> int:
+        return 0 if self._vectors is None else len(self._vectors)
+
+    def _clear(self):
+        self._vectors = None
+        self._payloads = []
+        self._live = np.zeros(0, dtype=bool)
+        self._row = {}
+
+    def load(self, path: Optional[Path] = None):
+        """(Re)read the store from disk; a missing or mismatched store starts empty."""
+        if path is not None:
+            self.index_path = Path(path)
+        vec_path, meta_path = self._path("vectors.npy"), self._path("payloads.json")
+        with self._lock:
+            self._clear()
+            if not (vec_path.exists() and meta_path.exists()):
+                return
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta.get("version") != NUMPY_STORE_VERSION or meta.get("dim") != self.dim:
+                    raise ValueError("version or dimension mismatch")
+                vectors = np.load(vec_path, mmap_mode="r" if self.read_only else "r+")
+                if vectors.shape[1] != self.dim or vectors.dtype != self.dtype:
+                    raise ValueError("dimension or dtype mismatch")
+                if len(meta["payloads"]) > len(vectors):
+                    raise ValueError("payloads do not match the vector file")
+            except Exception as e:
+                print(f"Ignoring unreadable vector store {self.index_path}: {e}")
+                return
+            self._vectors = vectors
+            self._payloads = meta["payloads"]
+            self._live = np.array([p is not None for p in self._payloads], dtype=bool)
+            self._row = {p["symbol_id"]: i for i, p in enumerate(self._payloads) if p is not None}
+
+    def save(self, path: Optional[Path] = None):
+        """Flush vectors, then write the payload sidecar atomically (temp file + rename)."""
+        if self.read_only:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            if len(self._payloads) - len(self._row) > COMPACT_FRACTION * max(len(self._payloads), MIN_CAPACITY):
+                self._compact()
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            tmp = self._path("payloads.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": NUMPY_STORE_VERSION, "dim": self.dim, "payloads": self._payloads}, f)
+            os.replace(tmp, self._path("payloads.json"))
+            self._dirty = False
+
+    def _rewrite(self, rows: np.ndarray, capacity: int):
+        """Replace the matrix file with ``rows`` of the current one, in a file of ``capacity`` rows."""
+        tmp = self._path("vectors.npy.tmp")
+        vectors = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.dtype, shape=(capacity, self.dim))
+        if len(rows):
+            vectors[:len(rows)] = self._vectors[rows]
+        vectors.flush()
+        del vectors
+        os.replace(tmp, self._path("vectors.npy"))
+        self._vectors = np.load(self._path("vectors.npy"), mmap_mode="r+")
+
+    def _grow(self, used: int, needed: int):
+        """Make room for ``needed`` rows, keeping the first ``used``."""
+        if needed <= self._capacity():
+            return
+        capacity = max(MIN_CAPACITY, self._capacity())
+        while capacity < needed:
+            capacity *= 2
+        self._rewrite(np.arange(used), capacity)
+
+    def _compact(self):
+        keep = np.flatnonzero(self._live)
+        self._rewrite(keep, max(MIN_CAPACITY, self._capacity()))
+        self._payloads = [self._payloads[i] for i in keep]
+        self._live = np.ones(len(keep), dtype=bool)
+        self._row = {p["symbol_id"]: i for i, p in enumerate(self._payloads)}
+
+    def close(self):
+        """Persist pending changes and release the memory map."""
+        self.save()
+        with self._lock:
+            self._vectors = None
+
+    # -- writes ------------------------------------------------------------
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"Vector store {self.index_path} was opened read-only")
+
+    def reset(self):
+        """Drop every vector (e.g. before a full re-index)."""
+        self._check_writable()
+        with self._lock:
+            self._clear()
+            self._rewrite(np.zeros(0, dtype=np.int64), MIN_CAPACITY)
+            self._dirty = True
+        self.save()
+
+    def add(self, vectors: np.ndarray, metadatas: List[Dict[str, Any]]):
+        """Upsert by ``symbol_id``: known symbols are overwritten in place, new ones appended."""
+        if len(vectors) != len(metadatas):
+            raise ValueError("Vectors and metadata must have same length")
+        if not metadatas:
+            return
+        self._check_writable()
+        unit = normalize(vectors).astype(self.dtype)
+        with self._lock:
+            used = len(self._payloads)
+            rows = []
+            for meta in metadatas:
+                sid = meta["symbol_id"]
+                row = self._row.get(sid)
+                if row is None:
+                    row = len(self._payloads)
+                    self._payloads.append(None)
+                    self._row[sid] = row
+                self._payloads[row] = dict(meta)
+                rows.append(row)
+            self._grow(used, len(self._payloads))
+            live = np.zeros(len(self._payloads), dtype=bool)
+            live[:len(self._live)] = self._live
+            live[rows] = True
+            self._live = live
+            self._vectors[rows] = unit
+            self._dirty = True
+
+    def _delete_rows(self, rows: List[int]):
+        for row in rows:
+            self._row.pop(self._payloads[row]["symbol_id"], None)
+            self._payloads[row] = None
+        self._live[rows] = False
+        self._dirty = bool(rows) or self._dirty
+
+    def delete_by_symbol_ids(self, symbol_ids: List[str]):
+        """Delete the vectors of the given symbols (no-op for unknown ids)."""
+        self._check_writable()
+        with self._lock:
+            self._delete_rows([self._row[sid] for sid in set(symbol_ids) if sid in self._row])
+
+    def delete_by_file(self, file: str):
+        """Delete every vector whose payload belongs to the given source file."""
+        self._check_writable()
+        with self._lock:
+            self._delete_rows([row for row in self._row.values() if self._payloads[row].get("file") == str(file)])
+
+    # -- reads -------------------------------------------------------------
+
+    def get_vectors(self, symbol_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch stored (unit-length) vectors by symbol id; unknown ids are left out."""
+        with self._lock:
+            found = [(sid, self._row[sid]) for sid in symbol_ids if sid in self._row]
+            if not found:
+                return {}
+            rows = np.array([row for _, row in found])
+            vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        return {sid: v for (sid, _), v in zip(found, vectors)}
+
+    def search(self, query_vector: np.ndarray, k: int = 5) -> List[Dict[str, Any]]:
+        if query_vector.ndim > 1:
+            query_vector = query_vector[0]  # Take first if batch
+        return self.search_batch(query_vector[None, :], k=k)[0]
+
+    def search_batch(self, query_vectors: np.ndarray, k: int = 5, batch_size: int = 256) -> List[List[Dict[str, Any]]]:
+        """Exact cosine top-k for many query vectors."""
+        all_results = []
+        with self._lock:
+            n = len(self._payloads)
+            k = min(k, len(self._row))
+            if k <= 0:
+                return [[] for _ in range(len(query_vectors))]
+            for i in range(0, len(query_vectors), batch_size):
+                q = normalize(query_vectors[i:i + batch_size])
+                # Float32 copy of a row block plus its scores against every query
+                block = max(1, self.max_block_bytes // ((len(q) + self.dim) * 4))
+                best_idx = np.empty((len(q), 0), dtype=np.int64)
+                best_scores = np.empty((len(q), 0), dtype=np.float32)
+                for start in range(0, n, block):
+                    end = min(n, start + block)
+                    scores = q @ np.asarray(self._vectors[start:end], dtype=np.float32).T
+                    scores[:, ~self._live[start:end]] = -np.inf
+                    idx = np.broadcast_to(np.arange(start, end), scores.shape)
+                    best_idx, best_scores = top_k(
+                        np.hstack([best_scores, scores]), np.hstack([best_idx, idx]), k
+                    )
+                for idx, scores in zip(best_idx, best_scores):
+                    results = []
+                    for row, score in zip(idx.tolist(), scores.tolist()):
+                        if score == -np.inf:
+                            continue
+                        item = self._payloads[row].copy()
+                        item['score'] = score
+                        results.append(item)
+                    all_results.append(results)
+        return all_results
@@ -1,7 +1,7 @@
 """Qdrant vector store implementation."""
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 import time
 import subprocess
@@ -13,17 +13,53 @@ try:
 except ImportError:
     raise ImportError("Please install qdrant-client to use QdrantStore.")
 
+# Fixed namespace so point IDs are stable across runs and machines
+POINT_ID_NAMESPACE = uuid.UUID("6f1c1d2e-3b7a-5e4c-9a8d-2f0b7c6e4a91")
+
+def point_id(symbol_id: str) -> str:
+    """Deterministic Qdrant point ID (UUIDv5) for a symbol."""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, symbol_id))
+
 class QdrantStore:
-    def __init__(self, index_path: Optional[Path] = None, collection_name: str = "codebase", dim: int = 768, max_retries: int = 3):
+    def __init__(self, index_path: Optional[Path] = None, collection_name: str = "codebase", dim: int = 768, max_retries: int = 3,
+                 url: Optional[str] = None, quantization: Optional[str] = None, on_disk: bool = False,
+                 on_disk_payload: bool = False, hnsw_m: Optional[int] = None, hnsw_ef_construct: Optional[int] = None,
+                 search_ef: Optional[int] = None, upsert_batch_size: int = 256):
+        """
+        url: Qdrant server to use instead of the embedded store at index_path.
+        quantization: None or "int8" (scalar quantisation, originals kept for rescoring).
+        on_disk / on_disk_payload: keep vectors / payloads on disk (memmap) instead of RAM.
+        hnsw_m / hnsw_ef_construct / search_ef: HNSW graph and search parameters.
+        Storage options only apply when the collection is created, so changing
+        them needs a full re-index. The embedded store ignores quantisation and
+        HNSW settings (it always searches exactly).
+        """
         self.dim = dim
         self.collection_name = collection_name
         self.index_path = Path(index_path) if index_path else Path("./qdrant_data")
+        if quantization not in (None, "", "int8"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.quantization = quantization or None
+        self.on_disk = on_disk
+        self.on_disk_payload = on_disk_payload
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.search_params = None
+        # Only a server uses these; the embedded store warns about them
+        if url and (search_ef or self.quantization):
+            self.search_params = models.SearchParams(
+                hnsw_ef=search_ef,
+                quantization=models.QuantizationSearchParams(rescore=True) if self.quantization else None
+            )
         
         # Try to connect with retry logic
         for attempt in range(max_retries):
             try:
-                path_str = str(self.index_path)
-                self.client = QdrantClient(path=path_str)
+                if url:
+                    self.client = QdrantClient(url=url)
+                else:
+                    self.client = QdrantClient(path=str(self.index_path))
                 break
             except RuntimeError as e:
                 if "already accessed" in str(e) and attempt < max_retries - 1:
@@ -35,10 +71,47 @@ class QdrantStore:
         
         # Ensure collection exists
         if not self.client.collection_exists(collection_name):
-            self.client.create_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+            self._create_collection()
+
+    def _create_collection(self):
+        hnsw_config = None
+        if self.hnsw_m is not None or self.hnsw_ef_construct is not None:
+            hnsw_config = models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+        quantization_config = None
+        if self.quantization == "int8":
+            quantization_config = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True  # int8 copies in RAM, originals follow on_disk
+                )
             )
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=models.VectorParams(
+                size=self.dim, distance=models.Distance.COSINE, on_disk=self.on_disk or None
+            ),
+            on_disk_payload=self.on_disk_payload or None,
+            hnsw_config=hnsw_config,
+            quantization_config=quantization_config,
+        )
+
+    def __len__(self) -> int:
+        return self.client.count(collection_name=self.collection_name, exact=True).count
+
+    def stored_format(self) -> Tuple[Optional[int], Optional[str]]:
+        """(dimension, dtype) of the existing collection's vectors; (None, None) if unknown."""
+        params = self.client.get_collection(self.collection_name).config.params.vectors
+        if not hasattr(params, "size"):
+            return None, None  # named vectors: not a collection this store created
+        dtype = params.datatype.value.lower() if params.datatype else "float32"
+        return params.size, dtype
+
+    def reset(self):
+        """Drop and recreate the collection (e.g. before a full re-index)."""
+        if self.client.collection_exists(self.collection_name):
+            self.client.delete_collection(self.collection_name)
+        self._create_collection()
     
     def _cleanup_stale_locks(self):
         """Clean up stale lock files and kill zombie processes."""
@@ -88,22 +161,55 @@ class QdrantStore:
         if len(vectors) != len(metadatas):
             raise ValueError("Vectors and metadata must have same length")
         
-        points = []
-        for i, (vec, meta) in enumerate(zip(vectors, metadatas)):
-            # Qdrant requires unique IDs. We can use UUIDs or hash-based IDs.
-            # Using UUIDs for simplicity here, or derived from symbol_id if stable.
-            point_id = str(uuid.uuid4())
-            points.append(models.PointStruct(
-                id=point_id,
-                vector=vec.tolist(),
-                payload=meta
-            ))
-            
-        self.client.upsert(
+        if not metadatas:
+            return
+        
+        # The client batches and serialises the array itself, in chunks of upsert_batch_size;
+        # IDs are derived from symbol_id so re-indexing overwrites in place
+        self.client.upload_collection(
+            collection_name=self.collection_name,
+            vectors=np.ascontiguousarray(vectors, dtype=np.float32),
+            payload=metadatas,
+            ids=[point_id(meta["symbol_id"]) for meta in metadatas],
+            batch_size=self.upsert_batch_size,
+            wait=True
+        )
+
+    def delete_by_symbol_ids(self, symbol_ids: List[str]):
+        """Delete the points of the given symbols (no-op for unknown ids)."""
+        if not symbol_ids:
+            return
+        self.client.delete(
             collection_name=self.collection_name,
-            points=points
+            points_selector=models.PointIdsList(points=[point_id(sid) for sid in symbol_ids]),
         )
 
+    def delete_by_file(self, file: str):
+        """Delete every point whose payload belongs to the given source file."""
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=[models.FieldCondition(key="file", match=models.MatchValue(value=str(file)))]
+                )
+            ),
+        )
+
+    def get_vectors(self, symbol_ids: List[str]) -> Dict[str, np.ndarray]:
+        """Fetch stored vectors by symbol id; unknown ids are left out."""
+        vectors = {}
+        ids = list(symbol_ids)
+        for i in range(0, len(ids), 1024):
+            records = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=[point_id(sid) for sid in ids[i:i + 1024]],
+                with_payload=True,
+                with_vectors=True
+            )
+            for rec in records:
+                vectors[rec.payload["symbol_id"]] = np.asarray(rec.vector, dtype=np.float32)
+        return vectors
+
     def search(self, query_vector: np.ndarray, k: int = 5) -> List[Dict[str, Any]]:
         if query_vector.ndim > 1:
             query_vector = query_vector[0] # Take first if batch
@@ -111,7 +217,8 @@ class QdrantStore:
         response = self.client.query_points(
             collection_name=self.collection_name,
             query=query_vector.tolist(),
-            limit=k
+            limit=k,
+            search_params=self.search_params
         )
         
         results = []
@@ -121,10 +228,31 @@ class QdrantStore:
             results.append(item)
         return results
 
-    def save(self, path: Path):
+    def search_batch(self, query_vectors: np.ndarray, k: int = 5, batch_size: int = 256) -> List[List[Dict[str, Any]]]:
+        """Top-k search for many query vectors using batched requests."""
+        all_results = []
+        for i in range(0, len(query_vectors), batch_size):
+            requests = [
+                models.QueryRequest(query=vec.tolist(), limit=k, with_payload=True, params=self.search_params)
+                for vec in query_vectors[i:i + batch_size]
+            ]
+            responses = self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=requests
+            )
+            for response in responses:
+                results = []
+                for hit in response.points:
+                    item = hit.payload.copy()
+                    item['score'] = hit.score
+                    results.append(item)
+                all_results.append(results)
+        return all_results
+
+    def save(self, path: Optional[Path] = None):
         # Qdrant persists automatically to the path given in __init__
         pass
 
-    def load(self, path: Path):
+    def load(self, path: Optional[Path] = None):
         # Qdrant loads automatically from the path given in __init__
         pass
@@ -0,0 +1,42 @@
+"""In-memory lookup of parsed symbols by qualified name."""
+from typing import Dict, Iterable, List, Optional
+
+from ..types import Symbol
+
+
+class SymbolTable:
+    """``qualname -> Symbol`` plus a short-name index for partial lookups.
+
+    The agent often only knows ``Class.method`` or a bare function name from the
+    code it is reading; ``resolve`` maps such suffixes to full qualnames.
+    """
+
+    def __init__(self, symbols: Iterable[Symbol] = ()):
+        self._by_qualname: Dict[str, Symbol] = {}
+        self._by_name: Dict[str, List[str]] = {}
+        self.update(symbols)
+
+    def __len__(self) -> int:
+        return len(self._by_qualname)
+
+    def update(self, symbols: Iterable[Symbol]):
+        """Replace the table contents with ``symbols``."""
+        self._by_qualname = {s.qualname: s for s in symbols}
+        self._by_name = {}
+        for qualname in self._by_qualname:
+            self._by_name.setdefault(qualname.rsplit(".", 1)[-1], []).append(qualname)
+
+    def get(self, qualname: str) -> Optional[Symbol]:
+        return self._by_qualname.get(qualname)
+
+    def resolve(self, name: str) -> List[Symbol]:
+        """Exact qualname match, else every symbol whose qualname ends with ``.name``."""
+        name = name.strip().strip("`'\"").rstrip("()")
+        sym = self._by_qualname.get(name)
+        if sym is not None:
+            return [sym]
+        last = name.rsplit(".", 1)[-1]
+        return [
+            self._by_qualname[q] for q in self._by_name.get(last, [])
+            if q == name or q.endswith("." + name)
+        ]
@@ -0,0 +1,218 @@
+"""In-process trigram index over the indexed source files, used by the search_code tool."""
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:  # Python 3.11+
+    import re._parser as sre_parse
+    from re._constants import LITERAL
+except ImportError:  # pragma: no cover
+    import sre_parse
+    from sre_constants import LITERAL
+
+TRIGRAM_INDEX_VERSION = 1
+MAX_SEARCH_RESULTS = 50
+
+# Lines that define something rank above plain mentions
+_DEFINITION_RE = re.compile(r"^\s*(?:async\s+def|def|class)\s")
+
+
+def trigrams(text: str) -> np.ndarray:
+    """Sorted unique case-folded byte trigrams of ``text``, packed into uint32.
+
+    Grams spanning a line break are skipped, since matching is per line.
+    """
+    data = np.frombuffer(text.lower().encode("utf-8"), dtype=np.uint8).astype(np.uint32)
+    if len(data) < 3:
+        return np.empty(0, dtype=np.uint32)
+    grams = (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+    newline = (data[:-2] == 10) | (data[1:-1] == 10) | (data[2:] == 10)
+    return np.unique(grams[~newline])
+
+
+def required_literals(pattern: str, flags: int = 0) -> List[str]:
+    """Literal runs every match of ``pattern`` must contain.
+
+    Only top-level literals are used, so an alternation or an optional group
+    just yields fewer (possibly no) filters, never a wrong one.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    runs, current = [], []
+    for op, arg in parsed:
+        if op is LITERAL:
+            current.append(chr(arg))
+        else:
+            runs.append("".join(current))
+            current = []
+    runs.append("".join(current))
+    return [r for r in runs if len(r) >= 3]
+
+
+class TrigramIndex:
+    """Maps trigrams to the files containing them.
+
+    Queries intersect the posting lists of the query's trigrams and only scan
+    the candidate files line by line, so a search touches a handful of files
+    instead of the whole tree. Each file is stamped with ``(mtime_ns, size)``,
+    which lets ``refresh`` re-read only files that changed since the last run.
+
+    Per-file gram arrays are the source of truth; the CSR posting lists
+    (``_keys``/``_starts``/``_post``) are rebuilt lazily after a change.
+    """
+
+    def __init__(self, path: Optional[Path] = None,
+                 read_lines: Optional[Callable[[str], List[str]]] = None):
+        self.path = Path(path) if path else None
+        # Where candidate files are read from; the orchestrator passes its SourceCache
+        self.read_lines = read_lines or (lambda p: Path(p).read_text(encoding="utf-8").splitlines())
+        self._lock = threading.Lock()
+        self._stamps: Dict[str, Tuple[int, int]] = {}
+        self._grams: Dict[str, np.ndarray] = {}
+        self._files: List[str] = []
+        self._keys = self._starts = self._post = None
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._stamps)
+
+    # -- building ----------------------------------------------------------
+
+    def refresh(self, files: Iterable[str]) -> int:
+        """Make the index cover exactly ``files``; returns how many were added, re-read or dropped."""
+        wanted = set(files)
+        updated = 0
+        with self._lock:
+            for file in [f for f in self._stamps if f not in wanted]:
+                del self._stamps[file], self._grams[file]
+                updated += 1
+            for file in sorted(wanted):
+                try:
+                    st = os.stat(file)
+                    stamp = (st.st_mtime_ns, st.st_size)
+                    if self._stamps.get(file) == stamp:
+                        continue
+                    text = Path(file).read_text(encoding="utf-8", errors="ignore")
+                except OSError:
+                    if file in self._stamps:
+                        del self._stamps[file], self._grams[file]
+                        updated += 1
+                    continue
+                self._stamps[file] = stamp
+                self._grams[file] = trigrams(text)
+                updated += 1
+            if updated:
+                self._keys = None
+        return updated
+
+    def _build(self):
+        """Rebuild the posting lists from the per-file grams (lock held)."""
+        self._files = sorted(self._grams)
+        arrays = [self._grams[f] for f in self._files]
+        grams = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint32)
+        file_ids = np.repeat(np.arange(len(self._files), dtype=np.int32), [len(a) for a in arrays])
+        # Stable sort keeps file ids ascending inside each posting list
+        order = np.argsort(grams, kind="stable")
+        grams, self._post = grams[order], file_ids[order]
+        self._keys, starts = np.unique(grams, return_index=True)
+        self._starts = np.append(starts, len(grams))
+
+    # -- persistence -------------------------------------------------------
+
+    def load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with np.load(self.path) as data:
+                if int(data["version"]) != TRIGRAM_INDEX_VERSION:
+                    return
+                offsets = data["offsets"]
+                grams = data["grams"]
+                for i, (file, stamp) in enumerate(zip(data["files"].tolist(), data["stamps"].tolist())):
+                    self._stamps[file] = tuple(stamp)
+                    self._grams[file] = grams[offsets[i]:offsets[i + 1]]
+        except Exception as e:
+            print(f"Ignoring unreadable search index {self.path}: {e}")
+            self._stamps.clear()
+            self._grams.clear()
+
+    def save(self):
+        """Write the index atomically (temp file + rename)."""
+        if self.path is None:
+            return
+        with self._lock:
+            files = sorted(self._stamps)
+            arrays = [self._grams[f] for f in files]
+            offsets = np.zeros(len(files) + 1, dtype=np.int64)
+            np.cumsum([len(a) for a in arrays], out=offsets[1:])
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    version=np.array(TRIGRAM_INDEX_VERSION),
+                    files=np.array(files, dtype=str),
+                    stamps=np.array([self._stamps[f] for f in files], dtype=np.int64).reshape(-1, 2),
+                    offsets=offsets,
+                    grams=np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint32),
+                )
+        os.replace(tmp, self.path)
+
+    # -- querying ----------------------------------------------------------
+
+    def _candidates(self, literals: List[str], under: Optional[str]) -> List[str]:
+        with self._lock:
+            if self._keys is None:
+                self._build()
+            ids: Optional[np.ndarray] = None
+            query = np.unique(np.concatenate([trigrams(lit) for lit in literals])) if literals else []
+            for g in query:
+                i = np.searchsorted(self._keys, g)
+                if i == len(self._keys) or self._keys[i] != g:
+                    return []
+                posting = self._post[self._starts[i]:self._starts[i + 1]]
+                ids = posting if ids is None else np.intersect1d(ids, posting, assume_unique=True)
+                if not len(ids):
+                    return []
+            files = self._files if ids is None else [self._files[i] for i in ids.tolist()]
+        if under:
+            prefix = under.rstrip(os.sep) + os.sep
+            files = [f for f in files if f.startswith(prefix) or f == under]
+        return files
+
+    def search(self, query: str, regex: bool = False, ignore_case: bool = False,
+               under: Optional[str] = None, limit: int = MAX_SEARCH_RESULTS) -> Tuple[List[Tuple[str, int, str]], int]:
+        """Find lines matching ``query`` (a substring, or a regex with ``regex=True``).
+
+        Returns up to ``limit`` ``(file, line number, line)`` hits, definitions
+        first and then files with the most hits, plus the total number of hits.
+        Raises ``re.error`` for an invalid regex.
+        """
+        flags = re.IGNORECASE if ignore_case else 0
+        if regex:
+            matcher = re.compile(query, flags)
+            literals = required_literals(query, flags)
+        else:
+            matcher = re.compile(re.escape(query), flags)
+            literals = [query] if len(query) >= 3 else []
+
+        per_file: List[List[Tuple[str, int, str]]] = []
+        for file in self._candidates(literals, under):
+            try:
+                lines = self.read_lines(file)
+            except (OSError, UnicodeDecodeError):
+                continue
+            hits = [(file, i, line) for i, line in enumerate(lines, 1) if matcher.search(line)]
+            if hits:
+                per_file.append(hits)
+
+        total = sum(len(h) for h in per_file)
+        per_file.sort(key=lambda hits: -len(hits))
+        ranked = [h for hits in per_file for h in hits]
+        ranked.sort(key=lambda h: not _DEFINITION_RE.match(h[2]))  # stable: keeps file order
+        return ranked[:limit], total
@@ -1,11 +1,93 @@
 """Markdown writer with idempotent section updates."""
 from pathlib import Path
+import os
 import re
-from typing import Optional
+import stat
+import tempfile
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Generated sections look like:
+#   <!-- BEGIN: auto:<symbol_id> (hash=<source hash>) -->
+#   ...
+#   <!-- END: auto:<symbol_id> -->
+MARKER_RE = re.compile(
+    r"<!-- (?:BEGIN: auto:(?P<begin>\S+) \(hash=(?P<hash>[^)]*)\)|END: auto:(?P<end>\S+)) -->"
+)
+
+# Process umask, read once at import (reading it means briefly setting it, which isn't thread-safe)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+class Section(NamedTuple):
+    start: int  # offset of the BEGIN marker
+    end: int  # offset just past the END marker
+    source_hash: str
+
+def parse_sections(text: str) -> Dict[str, Section]:
+    """Index the generated sections of a page in a single scan."""
+    sections = {}
+    open_id, open_start, open_hash = None, 0, ""
+    for m in MARKER_RE.finditer(text):
+        if m.group("begin") is not None:
+            open_id, open_start, open_hash = m.group("begin"), m.start(), m.group("hash")
+        elif m.group("end") == open_id:
+            sections[open_id] = Section(open_start, m.end(), open_hash)
+            open_id = None
+    return sections
+
+def read_section_hashes(file_path: Path) -> Dict[str, str]:
+    """symbol_id -> source hash for every generated section in a page."""
+    try:
+        text = Path(file_path).read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    return {sid: sec.source_hash for sid, sec in parse_sections(text).items()}
+
+def read_section_contents(file_path: Path) -> Dict[str, str]:
+    """symbol_id -> markdown between the markers, for every generated section in a page."""
+    try:
+        text = Path(file_path).read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    out = {}
+    for sid, sec in parse_sections(text).items():
+        body = text[sec.start:sec.end]
+        out[sid] = body[body.index("-->") + 3:body.rindex("<!--")].strip()
+    return out
+
+def _render_section(symbol_id: str, content: str, source_hash: str) -> str:
+    start_marker = f"<!-- BEGIN: auto:{symbol_id} (hash={source_hash}) -->"
+    end_marker = f"<!-- END: auto:{symbol_id} -->"
+    return f"{start_marker}\n{content}\n{end_marker}"
+
+def _page_mode(file_path: Path) -> int:
+    """Mode for a rewritten page: the existing page's, else what a plain open() would give."""
+    try:
+        return stat.S_IMODE(os.stat(file_path).st_mode)
+    except OSError:
+        return 0o666 & ~_UMASK
+
+def _atomic_write(file_path: Path, text: str):
+    fd, tmp = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        # mkstemp creates the file 0600 and os.replace keeps that
+        os.chmod(tmp, _page_mode(file_path))
+        os.replace(tmp, file_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
 
 class MarkdownWriter:
     def __init__(self, docs_root: Path):
         self.docs_root = docs_root
+        # Sections staged during a run, flushed per page
+        self._pending: Dict[Path, Dict[str, Tuple[str, str]]] = {}
+        self._file_locks: Dict[Path, threading.Lock] = {}
+        self._lock = threading.Lock()
 
     def _get_file_path(self, symbol_qualname: str) -> Path:
         # Map pkg.module.Class -> docs/api/pkg/module.md
@@ -62,6 +144,28 @@ class MarkdownWriter:
         pass
 
     def write_section(self, file_path: Path, symbol_id: str, content: str, source_hash: str):
+        """Write a single section immediately (read, update, atomic replace)."""
+        with self._file_lock(file_path):
+            self._apply(file_path, {symbol_id: (content, source_hash)})
+
+    def stage_section(self, file_path: Path, symbol_id: str, content: str, source_hash: str):
+        """Queue a section for the next flush(). Safe to call from worker threads."""
+        with self._lock:
+            self._pending.setdefault(Path(file_path), {})[symbol_id] = (content, source_hash)
+
+    def flush(self):
+        """Write all staged sections, touching each page once."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for file_path, sections in pending.items():
+            with self._file_lock(file_path):
+                self._apply(file_path, sections)
+
+    def _file_lock(self, file_path: Path) -> threading.Lock:
+        with self._lock:
+            return self._file_locks.setdefault(Path(file_path), threading.Lock())
+
+    def _apply(self, file_path: Path, sections: Dict[str, Tuple[str, str]]):
         file_path.parent.mkdir(parents=True, exist_ok=True)
         
         if file_path.exists():
@@ -69,22 +173,21 @@ class MarkdownWriter:
         else:
             text = f"# {file_path.stem}\n\n"
 
-        # Markers
-        start_marker = f"<!-- BEGIN: auto:{symbol_id} (hash={source_hash}) -->"
-        end_marker = f"<!-- END: auto:{symbol_id} -->"
-        
-        # Regex to find existing section
-        # We look for BEGIN: auto:symbol_id .*? END: auto:symbol_id
-        pattern = re.compile(
-            rf"<!-- BEGIN: auto:{re.escape(symbol_id)} \(hash=.*?>.*?<!-- END: auto:{re.escape(symbol_id)} -->",
-            re.DOTALL
-        )
+        existing = parse_sections(text)
         
-        new_section = f"{start_marker}\n{content}\n{end_marker}"
+        # Rebuild the page in one pass: replace known sections in place, append new ones
+        parts = []
+        pos = 0
+        for symbol_id, sec in sorted(existing.items(), key=lambda kv: kv[1].start):
+            if symbol_id not in sections:
+                continue
+            content, source_hash = sections[symbol_id]
+            parts.append(text[pos:sec.start])
+            parts.append(_render_section(symbol_id, content, source_hash))
+            pos = sec.end
+        parts.append(text[pos:])
+        for symbol_id, (content, source_hash) in sections.items():
+            if symbol_id not in existing:
+                parts.append(f"\n\n{_render_section(symbol_id, content, source_hash)}")
         
-        if pattern.search(text):
-            text = pattern.sub(new_section, text)
-        else:
-            text += f"\n\n{new_section}"
-            
-        file_path.write_text(text, encoding="utf-8")
+        _atomic_write(file_path, "".join(parts))
@@ -0,0 +1,46 @@
+"""Bounded, thread-safe cache of source file lines."""
+from collections import OrderedDict
+from pathlib import Path
+from typing import List
+import threading
+
+class SourceCache:
+    """LRU cache of ``path -> lines`` shared by the generation workers.
+
+    Each dependency wave is generated in file order, so a small cache is
+    enough for each file to be read and split about once per wave; the agent's
+    file tools reuse it too.
+    """
+
+    def __init__(self, max_files: int = 64):
+        self.max_files = max(1, max_files)
+        self._lines: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lines(self, path: str) -> List[str]:
+        key = str(path)
+        with self._lock:
+            if key in self._lines:
+                self._lines.move_to_end(key)
+                self.hits += 1
+                return self._lines[key]
+            self.misses += 1
+
+        # Read outside the lock so workers on different files don't serialise
+        lines = Path(key).read_text(encoding="utf-8").splitlines()
+        with self._lock:
+            self._lines[key] = lines
+            self._lines.move_to_end(key)
+            while len(self._lines) > self.max_files:
+                self._lines.popitem(last=False)
+        return lines
+
+    def segment(self, path: str, start: int, end: int) -> str:
+        """Source of lines ``start..end`` (1-based, inclusive)."""
+        return "\n".join(self.lines(path)[start - 1:end])
+
+    def clear(self):
+        with self._lock:
+            self._lines.clear()
@@ -0,0 +1,78 @@
+"""Persistent, content-addressed cache of LLM responses (SQLite)."""
+from pathlib import Path
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+class LLMCache:
+    """Maps (model, prompt template, rendered inputs, sampling params) -> response text.
+
+    Entries beyond ``max_entries`` are evicted least-recently-used first.
+    One connection is shared behind a lock, so worker threads and the asyncio
+    engine can use the same instance.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 50_000):
+        self.path = Path(path)
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: Optional[str], template: str, inputs: Dict[str, Any], params: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"model": model, "template": template, "inputs": inputs, "params": params},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, last_used) VALUES (?, ?, ?)",
+                (key, response, time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                # Drop an extra 10% so eviction doesn't run on every insert
+                excess = count - self.max_entries + self.max_entries // 10
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return f"LLM cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,14 @@
 """LangChain wrapper for local LLMs."""
-from typing import Any, List, Optional, Dict
+from typing import Any, Iterator, List, Optional, Dict
+from contextlib import contextmanager
+import os
+import queue
 try:
     from langchain_core.language_models import LLM
+    from langchain_core.outputs import GenerationChunk
 except ImportError:
     from langchain.llms.base import LLM
+    from langchain.schema.output import GenerationChunk
 from pydantic import Field
 
 try:
@@ -11,26 +16,86 @@ try:
 except ImportError:
     Llama = None
 
+# Older llama_cpp builds lack the prompt cache; the model itself still works without it
+try:
+    from llama_cpp import LlamaRAMCache
+except ImportError:
+    LlamaRAMCache = None
+
+def available_memory() -> Optional[int]:
+    """Bytes the kernel can hand out without swapping (MemAvailable, which counts
+    reclaimable page cache); None where /proc/meminfo is missing or unreadable."""
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def instances_for_ram(model_path: str, wanted: int, prompt_cache_mb: int = 0) -> int:
+    """Clamp the number of model copies to what fits in available memory."""
+    available = available_memory()
+    try:
+        # Weights plus roughly 25% for KV cache and scratch buffers, plus the prompt cache
+        per_instance = os.path.getsize(model_path) * 1.25 + (max(0, prompt_cache_mb) << 20)
+    except OSError:
+        return max(1, wanted)
+    if available is None:
+        return max(1, wanted)
+    return max(1, min(wanted, int(available // per_instance)))
+
 class LocalLLM(LLM):
+    """llama.cpp model(s) behind a blocking pool.
+
+    A ``Llama`` instance is not thread-safe, so each call checks one out of a
+    queue of ``n_instances`` copies; with one copy, concurrent workers are simply
+    served one at a time. Each copy keeps the KV state of its last prompt (and,
+    with ``prompt_cache_mb``, a RAM cache of earlier ones), so the shared
+    template preamble is only evaluated once instead of on every call.
+    """
     model_path: str
     n_ctx: int = Field(default=4096)
     n_gpu_layers: int = Field(default=0)
     temperature: float = Field(default=0.1)
     max_tokens: int = Field(default=1024)
     stop: List[str] = Field(default_factory=list)
-    
-    _model: Any = None
+    n_instances: int = Field(default=1)
+    prompt_cache_mb: int = Field(default=1024)  # per instance, 0 disables
+
+    _pool: Any = None
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         if Llama is None:
             raise ImportError("llama-cpp-python is not installed")
-        self._model = Llama(
-            model_path=self.model_path,
-            n_ctx=self.n_ctx,
-            n_gpu_layers=self.n_gpu_layers,
-            verbose=False
-        )
+        cache_mb = self.prompt_cache_mb if LlamaRAMCache is not None else 0
+        if cache_mb < self.prompt_cache_mb:
+            print("This llama-cpp-python build has no LlamaRAMCache; prompt cache disabled.")
+        n = instances_for_ram(self.model_path, self.n_instances, cache_mb)
+        if n < self.n_instances:
+            print(f"Only {n} of {self.n_instances} local model instances fit in RAM.")
+        self._pool = queue.Queue()
+        for _ in range(n):
+            model = Llama(
+                model_path=self.model_path,
+                n_ctx=self.n_ctx,
+                n_gpu_layers=self.n_gpu_layers,
+                verbose=False
+            )
+            if cache_mb > 0:
+                model.set_cache(LlamaRAMCache(capacity_bytes=cache_mb << 20))
+            self._pool.put(model)
+
+    @contextmanager
+    def _checkout(self):
+        # Blocks until a model instance is free
+        model = self._pool.get()
+        try:
+            yield model
+        finally:
+            self._pool.put(model)
 
     @property
     def _llm_type(self) -> str:
@@ -44,15 +109,38 @@ class LocalLLM(LLM):
         **kwargs: Any,
     ) -> str:
         stop_tokens = stop or self.stop
-        output = self._model(
-            prompt,
-            max_tokens=self.max_tokens,
-            temperature=self.temperature,
-            stop=stop_tokens,
-            echo=False
-        )
+        with self._checkout() as model:
+            output = model(
+                prompt,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stop=stop_tokens,
+                echo=False
+            )
         return output["choices"][0]["text"]
 
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        # The instance stays checked out until the consumer finishes or closes the stream
+        with self._checkout() as model:
+            for part in model(
+                prompt,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stop=stop or self.stop,
+                echo=False,
+                stream=True
+            ):
+                chunk = GenerationChunk(text=part["choices"][0]["text"])
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
     @property
     def _identifying_params(self) -> Dict[str, Any]:
         return {
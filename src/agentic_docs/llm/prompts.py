@@ -71,7 +71,7 @@ AGENT_PROMPT = PromptTemplate(
     input_variables=["input", "agent_scratchpad", "tool_names", "tools"],
     template="""You are a Senior Python Engineer (Research Agent).
 Your task is to analyze the provided Python code to understand its behavior, parameters, return values, and potential exceptions.
-You have access to tools to read files and search the codebase if you need more context (e.g. to understand a custom type or a called function).
+You have access to tools to look up symbols by name, search the codebase and read files if you need more context (e.g. to understand a custom type or a called function). Prefer get_signature/get_symbol when you know the name.
 
 Tools Available:
 {tools}
@@ -122,3 +122,91 @@ CRITICAL INSTRUCTIONS:
 4. DO NOT wrap output in markdown code blocks.
 """
 )
+
+FUSED_DOCS_PROMPT = PromptTemplate(
+    input_variables=["code", "context"],
+    template="""You are a Senior Python Engineer writing API documentation.
+Analyze the following Python code and its context, then write the final Markdown documentation directly.
+
+Context (related symbols):
+{context}
+
+Code to Document:
+```python
+{code}
+```
+
+Generate the Markdown documentation following this structure:
+### `SymbolName`
+
+**Summary**
+...
+
+**Parameters**
+- `name` (type): description
+
+**Returns**
+- (type): description
+
+**Raises**
+- `Exception`: description
+
+**Examples**
+```python
+...
+```
+
+**See also**
+...
+
+CRITICAL INSTRUCTIONS:
+1. Output ONLY the Markdown content.
+2. DO NOT output any "thinking" process, reasoning, or internal monologue.
+3. DO NOT output any conversational text like "Here is the documentation".
+4. DO NOT wrap the output in markdown code blocks (e.g. ```markdown ... ```). Just output the raw markdown.
+"""
+)
+
+BATCH_DOCS_PROMPT = PromptTemplate(
+    input_variables=["symbols", "context"],
+    template="""You are a Senior Python Engineer writing API documentation.
+Write Markdown documentation for EACH of the Python symbols below. They belong to the same class or module.
+
+Context (related symbols):
+{context}
+
+Symbols to Document:
+{symbols}
+
+For each symbol, follow this structure:
+### `SymbolName`
+
+**Summary**
+...
+
+**Parameters**
+- `name` (type): description
+
+**Returns**
+- (type): description
+
+**Raises**
+- `Exception`: description
+
+**Examples**
+```python
+...
+```
+
+Wrap the documentation of every symbol in its delimiters, using the exact symbol id given above:
+<<<BEGIN symbol_id>>>
+...markdown...
+<<<END symbol_id>>>
+
+CRITICAL INSTRUCTIONS:
+1. Output ONLY the delimited Markdown blocks, one per symbol, in the order given.
+2. DO NOT output any "thinking" process, reasoning, or internal monologue.
+3. DO NOT output any conversational text like "Here is the documentation".
+4. DO NOT wrap the output in markdown code blocks (e.g. ```markdown ... ```).
+"""
+)
@@ -0,0 +1,103 @@
+"""Token accounting and budget enforcement for LLM calls."""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional, Tuple
+import contextvars
+import threading
+import time
+
+# Rough chars-per-token ratio for code and English prose, used when the
+# backend reports no usage metadata.
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def usage_from_response(response: Any, prompt: str) -> Tuple[int, int, str]:
+    """(prompt tokens, completion tokens, text) for an LLM response.
+
+    Uses ``usage_metadata`` (chat models) or ``response_metadata["token_usage"]``
+    when present, otherwise estimates from the prompt and completion text.
+    """
+    text = response.content if hasattr(response, "content") else str(response)
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return int(usage.get("input_tokens", 0)), int(usage.get("output_tokens", 0)), text
+    meta = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+    if meta:
+        return int(meta.get("prompt_tokens", 0)), int(meta.get("completion_tokens", 0)), text
+    return estimate_tokens(prompt), estimate_tokens(text), text
+
+@dataclass
+class CallStats:
+    """Tokens and wall time attributed to one unit of work (e.g. a symbol)."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    calls: float = 0  # fractional when a call is shared by a batch of symbols
+    seconds: float = 0.0
+
+# Stats of the unit of work running in the current thread / asyncio task
+_current_stats: contextvars.ContextVar[Optional[CallStats]] = contextvars.ContextVar(
+    "current_stats", default=None
+)
+
+@contextmanager
+def track_usage() -> Iterator[CallStats]:
+    """Attribute every LLM call recorded inside the block to a fresh CallStats."""
+    stats = CallStats()
+    token = _current_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.seconds = time.perf_counter() - start
+        _current_stats.reset(token)
+
+class TokenBudget:
+    """Thread-safe running totals plus an optional cap on total tokens.
+
+    Work reserves an estimate before it starts (``try_reserve``) and settles
+    with the real numbers afterwards, so concurrent workers can't collectively
+    overshoot the cap by more than the estimation error.
+    """
+
+    def __init__(self, limit: int = 0):
+        self.limit = limit  # 0 = unlimited
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def record(self, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.calls += 1
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.calls += 1
+
+    def try_reserve(self, tokens: int) -> bool:
+        with self._lock:
+            if self.limit and self.total + self._reserved + tokens > self.limit:
+                return False
+            self._reserved += tokens
+            return True
+
+    def release(self, tokens: int):
+        with self._lock:
+            self._reserved = max(0, self._reserved - tokens)
+
+    def summary(self) -> str:
+        cap = f" of {self.limit}" if self.limit else ""
+        return (
+            f"Tokens: {self.total}{cap} used ({self.prompt_tokens} prompt, "
+            f"{self.completion_tokens} completion, {self.calls} calls)"
+        )
@@ -0,0 +1,198 @@
+"""Source file discovery: pruned directory walk, .gitignore and git ls-files."""
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+import os
+import re
+import shutil
+import subprocess
+
+# Directory names that are never descended into
+IGNORE_DIRS = {
+    ".venv", "venv", "site-packages", "node_modules", "build", "dist", "__pycache__",
+    ".git", ".hg", ".svn", ".idea", ".vscode", ".tox", ".nox", ".mypy_cache",
+    ".pytest_cache", ".ruff_cache", ".eggs", ".qdrant", ".embed_cache",
+    ".vector_store",
+}
+
+def glob_to_regex(pattern: str, anchored: bool) -> re.Pattern:
+    """Translate a gitignore-style glob (with ``**``) to a regex on posix paths."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            j = pattern.find("]", i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:j].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    prefix = "^" if anchored else "^(?:.*/)?"
+    return re.compile(prefix + "".join(out) + "$")
+
+class GitIgnore:
+    """Rules from one ``.gitignore`` file, matched relative to its directory."""
+
+    def __init__(self, base: str, lines: Sequence[str]):
+        self.base = base  # posix path of the directory, relative to the walk root ("" = root)
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []  # (regex, negate, dir_only)
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            self.rules.append((glob_to_regex(line.lstrip("/"), anchored), negate, dir_only))
+
+    @classmethod
+    def from_file(cls, path: Path, base: str) -> Optional["GitIgnore"]:
+        try:
+            return cls(base, path.read_text(encoding="utf-8", errors="ignore").splitlines())
+        except OSError:
+            return None
+
+    def match(self, rel: str, is_dir: bool) -> Optional[bool]:
+        """True if ignored, False if re-included, None if no rule applies."""
+        if self.base:
+            if not rel.startswith(self.base + "/"):
+                return None
+            rel = rel[len(self.base) + 1:]
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel):
+                result = not negate
+        return result
+
+def _is_ignored(rel: str, is_dir: bool, ignores: List[GitIgnore]) -> bool:
+    # Deeper .gitignore files take precedence, so the last decision wins
+    ignored = False
+    for gi in ignores:
+        m = gi.match(rel, is_dir)
+        if m is not None:
+            ignored = m
+    return ignored
+
+def _matches_any(rel: str, patterns: List[re.Pattern]) -> bool:
+    return any(p.match(rel) for p in patterns)
+
+def _compile_globs(globs: Optional[Sequence[str]]) -> List[re.Pattern]:
+    return [glob_to_regex(g.strip("/"), "/" in g.strip("/")) for g in globs or []]
+
+def walk_files(root: Path, suffix: str = ".py", include: Optional[Sequence[str]] = None,
+               exclude: Optional[Sequence[str]] = None, use_gitignore: bool = True) -> List[Path]:
+    """Walk ``root`` with os.scandir, pruning ignored directories before descending."""
+    include_re = _compile_globs(include)
+    exclude_re = _compile_globs(exclude)
+    files = []
+
+    # Stack of (directory, its posix path relative to root, active .gitignore rules)
+    stack: List[Tuple[str, str, List[GitIgnore]]] = [(str(root), "", [])]
+    while stack:
+        dir_path, rel_dir, ignores = stack.pop()
+        if use_gitignore:
+            gi = GitIgnore.from_file(Path(dir_path) / ".gitignore", rel_dir)
+            if gi is not None and gi.rules:
+                ignores = ignores + [gi]
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError:
+            continue
+        for entry in entries:
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in IGNORE_DIRS or entry.name.endswith(".egg-info"):
+                    continue
+                if _matches_any(rel, exclude_re) or _is_ignored(rel, True, ignores):
+                    continue
+                stack.append((entry.path, rel, ignores))
+            elif entry.name.endswith(suffix):
+                if _matches_any(rel, exclude_re) or _is_ignored(rel, False, ignores):
+                    continue
+                if include_re and not _matches_any(rel, include_re):
+                    continue
+                files.append(Path(entry.path))
+    return sorted(files)
+
+def git_ls_files(root: Path, suffix: str = ".py", include: Optional[Sequence[str]] = None,
+                 exclude: Optional[Sequence[str]] = None) -> List[Path]:
+    """Tracked and untracked-but-not-ignored files, as reported by git."""
+    result = subprocess.run(
+        ["git", "-C", str(root), "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+        capture_output=True,
+        check=True
+    )
+    include_re = _compile_globs(include)
+    exclude_re = _compile_globs(exclude)
+    files = []
+    for rel in sorted(set(result.stdout.decode("utf-8", errors="surrogateescape").split("\0"))):
+        if not rel.endswith(suffix):
+            continue
+        parts = rel.split("/")
+        if any(p in IGNORE_DIRS for p in parts[:-1]):
+            continue
+        if _matches_any(rel, exclude_re) or any(
+            _matches_any("/".join(parts[:i]), exclude_re) for i in range(1, len(parts))
+        ):
+            continue
+        if include_re and not _matches_any(rel, include_re):
+            continue
+        path = root / rel
+        # --cached also lists files deleted from the working tree
+        if path.is_file():
+            files.append(path)
+    return files
+
+def discover_files(root: str, suffix: str = ".py", mode: str = "auto",
+                   include: Optional[Sequence[str]] = None,
+                   exclude: Optional[Sequence[str]] = None) -> List[Path]:
+    """
+    Find source files under ``root``.
+    mode: "git" (git ls-files), "walk" (pruned scandir walk honouring .gitignore)
+    or "auto" (git inside a git checkout, walk otherwise).
+    include/exclude are globs relative to root, e.g. "src/**" or "tests/".
+    """
+    r = Path(root)
+    if mode not in ("auto", "git", "walk"):
+        raise ValueError(f"Unknown discovery mode: {mode}")
+
+    if mode == "git" or (mode == "auto" and shutil.which("git") and (r / ".git").exists()):
+        try:
+            return git_ls_files(r, suffix, include, exclude)
+        except (OSError, subprocess.CalledProcessError) as e:
+            if mode == "git":
+                raise
+            print(f"git ls-files failed ({e}), falling back to directory walk.")
+    return walk_files(r, suffix, include, exclude)
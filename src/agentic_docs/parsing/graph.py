@@ -0,0 +1,76 @@
+"""Symbol dependency graph built from the imports and calls found while parsing."""
+from typing import Dict, Iterable, List, Optional, Set
+
+import networkx as nx
+
+from ..types import Symbol
+
+
+def _reexports(symbols: List[Symbol]) -> Dict[str, str]:
+    """``pkg.name -> pkg.mod.name`` for names a package ``__init__`` imports from its modules."""
+    out = {}
+    for s in symbols:
+        if s.kind == "module" and s.qualname.endswith(".__init__"):
+            package = s.qualname[: -len(".__init__")]
+            for target in s.imports:
+                if target.startswith(package + "."):
+                    out.setdefault(f"{package}.{target.rsplit('.', 1)[-1]}", target)
+    return out
+
+
+def _resolve(ref: str, ids: Set[str], reexports: Dict[str, str]) -> Optional[str]:
+    for _ in range(3):  # follow a short chain of re-exports
+        if ref in ids:
+            return ref
+        head, _, last = ref.rpartition(".")
+        if ref in reexports:
+            ref = reexports[ref]
+        elif head in reexports:
+            # pkg.Class.method where pkg.Class is re-exported
+            ref = f"{reexports[head]}.{last}"
+        else:
+            return None
+    return ref if ref in ids else None
+
+
+def build_dependency_graph(symbols: List[Symbol]) -> "nx.DiGraph":
+    """Directed graph over symbol ids with an edge ``caller -> callee``.
+
+    Edges come from ``Symbol.calls`` (calls and base classes) resolved against
+    the parsed symbols, following package re-exports; references to code
+    outside the repository are dropped.
+    """
+    ids = {s.symbol_id for s in symbols}
+    reexports = _reexports(symbols)
+    graph = nx.DiGraph()
+    graph.add_nodes_from(ids)
+    for s in symbols:
+        for ref in s.calls:
+            target = _resolve(ref, ids, reexports)
+            if target is not None and target != s.symbol_id:
+                graph.add_edge(s.symbol_id, target)
+    return graph
+
+
+def generation_levels(graph: "nx.DiGraph", symbol_ids: Iterable[str]) -> Dict[str, int]:
+    """Dependency level of each symbol among ``symbol_ids``, callees first.
+
+    Level 0 symbols call nothing else in the set; a symbol's level is one more
+    than its deepest callee's. Mutually recursive symbols share a level.
+    """
+    sub = graph.subgraph(symbol_ids)
+    dag = nx.condensation(sub)
+    level: Dict[int, int] = {}
+    for comp in reversed(list(nx.topological_sort(dag))):
+        level[comp] = max((level[c] + 1 for c in dag.successors(comp)), default=0)
+    return {sid: level[comp] for sid, comp in dag.graph["mapping"].items()}
+
+
+def direct_dependents(graph: "nx.DiGraph", symbol_ids: Iterable[str]) -> Set[str]:
+    """Symbols that directly call (or inherit from) any of ``symbol_ids``, excluding those."""
+    ids = set(symbol_ids)
+    out = set()
+    for sid in ids:
+        if sid in graph:
+            out.update(graph.predecessors(sid))
+    return out - ids
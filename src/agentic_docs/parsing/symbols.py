@@ -1,30 +1,66 @@
 """Walk files, parse AST, extract Symbol records."""
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import ast
 import hashlib
-from typing import List, Optional
+import multiprocessing
+import os
+from typing import Dict, Iterator, List, Optional
 from ..types import Symbol
 
-IGNORE = [".venv", "site-packages", "build", "dist", "__pycache__", ".git", ".idea", ".vscode"]
+from .discovery import IGNORE_DIRS, discover_files
+
+IGNORE = sorted(IGNORE_DIRS)
 
 def _sha(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
-def collect_py_files(root: str) -> list[Path]:
-    r = Path(root)
-    files = []
-    for p in r.rglob("*.py"):
-        if any(x in p.parts for x in IGNORE):
+def collect_py_files(root: str, mode: str = "auto",
+                     include: Optional[List[str]] = None,
+                     exclude: Optional[List[str]] = None) -> list[Path]:
+    return discover_files(root, ".py", mode=mode, include=include, exclude=exclude)
+
+def module_qualname(path: Path, src_root: Path, repo_root: Optional[Path] = None) -> str:
+    # Files outside the package root (tests/, scripts/...) are named from the repo
+    # root, so two same-named files in different directories don't share ids
+    for base in (src_root, repo_root):
+        if base is None:
             continue
-        files.append(p)
-    return files
+        try:
+            rel = path.relative_to(base).with_suffix("")
+            return ".".join(rel.parts)
+        except ValueError:
+            pass
+    return path.stem
 
-def module_qualname(path: Path, src_root: Path) -> str:
-    try:
-        rel = path.relative_to(src_root).with_suffix("")
-        return ".".join(rel.parts)
-    except ValueError:
-        return path.stem
+def _merge_duplicates(symbols: List[Symbol]) -> List[Symbol]:
+    """Fold definitions sharing a symbol_id into one symbol.
+
+    A ``@property`` getter and its ``@x.setter``, ``typing.overload`` stubs or a
+    redefined name all produce the same id. They become one symbol spanning
+    every definition, with a hash over all of them, so the manifest and the doc
+    markers see a single stable hash per id.
+    """
+    merged: Dict[str, Symbol] = {}
+    parts: Dict[str, List[Symbol]] = {}
+    for s in symbols:
+        if s.symbol_id in merged:
+            parts[s.symbol_id].append(s)
+        else:
+            merged[s.symbol_id] = s
+            parts[s.symbol_id] = [s]
+    for sid, group in parts.items():
+        if len(group) == 1:
+            continue
+        first = group[0]
+        first.start = min(s.start for s in group)
+        first.end = max(s.end for s in group)
+        first.hash = _sha("".join(s.hash for s in group))
+        first.docstring = next((s.docstring for s in group if s.docstring), None)
+        first.imports = sorted({i for s in group for i in s.imports})
+        first.decorators = [d for s in group for d in s.decorators]
+        first.calls = sorted({c for s in group for c in s.calls})
+    return list(merged.values())
 
 def _get_decorators(node: ast.AST) -> List[str]:
     decs = []
@@ -61,7 +97,77 @@ def _get_signature(node: ast.AST) -> Optional[str]:
         return sig
     return None
 
-def parse_symbols_file(path: Path, src_root: Path) -> list[Symbol]:
+def _dotted(node: ast.AST) -> Optional[str]:
+    """``a.b.c`` for a Name/Attribute chain, None for anything else (calls, subscripts...)."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+def _import_aliases(nodes: List[ast.stmt], mod: str) -> Dict[str, str]:
+    """Local name -> imported qualname for the import statements in ``nodes``."""
+    aliases = {}
+    # Package the module lives in (for __init__ files mod is "pkg.__init__")
+    package = mod.split(".")[:-1]
+    for node in nodes:
+        if isinstance(node, ast.Import):
+            for a in node.names:
+                if a.asname:
+                    aliases[a.asname] = a.name
+                else:
+                    head = a.name.split(".")[0]
+                    aliases[head] = head
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - (node.level - 1)] if node.level > 1 else package
+                prefix = ".".join(base + ([node.module] if node.module else []))
+            else:
+                prefix = node.module or ""
+            for a in node.names:
+                if a.name != "*":
+                    aliases[a.asname or a.name] = f"{prefix}.{a.name}" if prefix else a.name
+    return aliases
+
+def _references(node: ast.AST, mod: str, module_aliases: Dict[str, str],
+                module_defs: set, class_qualname: Optional[str] = None) -> tuple[List[str], List[str]]:
+    """(imports, calls) of a function or class body, resolved to qualnames.
+
+    Calls through ``self``/``cls`` resolve to the enclosing class; names that
+    are neither imported nor defined in the module (builtins, locals) are dropped.
+    """
+    body_imports = [n for n in ast.walk(node) if isinstance(n, (ast.Import, ast.ImportFrom)) and n is not node]
+    aliases = {**module_aliases, **_import_aliases(body_imports, mod)}
+    
+    dotted = [_dotted(n.func) for n in ast.walk(node) if isinstance(n, ast.Call)]
+    if isinstance(node, ast.ClassDef):
+        dotted += [_dotted(b) for b in node.bases]
+    
+    calls = []
+    for name in dotted:
+        if not name:
+            continue
+        head, _, rest = name.partition(".")
+        if head in ("self", "cls"):
+            # self.method() only; self.attr.method() is on an object of unknown type
+            if not class_qualname or not rest or "." in rest:
+                continue
+            target = f"{class_qualname}.{rest}"
+        elif head in aliases:
+            target = aliases[head] + (f".{rest}" if rest else "")
+        elif head in module_defs:
+            target = f"{mod}.{name}"
+        else:
+            continue
+        if target not in calls:
+            calls.append(target)
+    imports = sorted(set(_import_aliases(body_imports, mod).values()))
+    return imports, calls
+
+def parse_symbols_file(path: Path, src_root: Path, repo_root: Optional[Path] = None) -> list[Symbol]:
     try:
         src = path.read_text(encoding="utf-8")
         tree = ast.parse(src, filename=str(path))
@@ -69,15 +175,27 @@ def parse_symbols_file(path: Path, src_root: Path) -> list[Symbol]:
         print(f"Error parsing {path}: {e}")
         return []
 
-    mod = module_qualname(path, src_root)
+    mod = module_qualname(path, src_root, repo_root)
     out: list[Symbol] = []
     lines = src.splitlines()
+    
+    # Module-level imports and definitions, used to resolve call references
+    top_imports = [n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    module_aliases = _import_aliases(top_imports, mod)
+    module_defs = {
+        n.name for n in tree.body if isinstance(n, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+    }
 
     class V(ast.NodeVisitor):
         def visit_ClassDef(self, n):
             start, end = n.lineno, n.end_lineno
             # Extract source segment for hashing
             segment = "\n".join(lines[start-1:end])
+            # Only the class statement itself; methods get their own references
+            header = ast.ClassDef(name=n.name, bases=n.bases, keywords=n.keywords, body=[
+                item for item in n.body if not isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+            ], decorator_list=n.decorator_list)
+            imports, calls = _references(header, mod, module_aliases, module_defs, f"{mod}.{n.name}")
             
             out.append(Symbol(
                 symbol_id=f"{mod}.{n.name}", 
@@ -90,8 +208,9 @@ def parse_symbols_file(path: Path, src_root: Path) -> list[Symbol]:
                 start=start, 
                 end=end,
                 hash=_sha(segment), 
-                imports=[], # TODO: Extract imports if needed
-                decorators=_get_decorators(n)
+                imports=imports,
+                decorators=_get_decorators(n),
+                calls=calls
             ))
             # Visit methods
             for item in n.body:
@@ -104,6 +223,7 @@ def parse_symbols_file(path: Path, src_root: Path) -> list[Symbol]:
         def visit_Method(self, n, parent_qualname):
             start, end = n.lineno, n.end_lineno
             segment = "\n".join(lines[start-1:end])
+            imports, calls = _references(n, mod, module_aliases, module_defs, parent_qualname)
             out.append(Symbol(
                 symbol_id=f"{parent_qualname}.{n.name}", 
                 kind="method", 
@@ -115,8 +235,9 @@ def parse_symbols_file(path: Path, src_root: Path) -> list[Symbol]:
                 start=start, 
                 end=end,
                 hash=_sha(segment), 
-                imports=[],
-                decorators=_get_decorators(n)
+                imports=imports,
+                decorators=_get_decorators(n),
+                calls=calls
             ))
 
         def visit_FunctionDef(self, n):
@@ -126,6 +247,7 @@ def parse_symbols_file(path: Path, src_root: Path) -> list[Symbol]:
             # If we are at top level, parent is module.
             start, end = n.lineno, n.end_lineno
             segment = "\n".join(lines[start-1:end])
+            imports, calls = _references(n, mod, module_aliases, module_defs)
             out.append(Symbol(
                 symbol_id=f"{mod}.{n.name}", 
                 kind="function", 
@@ -137,8 +259,9 @@ def parse_symbols_file(path: Path, src_root: Path) -> list[Symbol]:
                 start=start, 
                 end=end,
                 hash=_sha(segment), 
-                imports=[],
-                decorators=_get_decorators(n)
+                imports=imports,
+                decorators=_get_decorators(n),
+                calls=calls
             ))
 
     # We need a custom visitor to handle the parent context properly
@@ -150,34 +273,72 @@ def parse_symbols_file(path: Path, src_root: Path) -> list[Symbol]:
         elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
             V().visit_FunctionDef(node)
 
+    out = _merge_duplicates(out)
+
     # module symbol
     out.append(Symbol(
         symbol_id=mod, kind="module", file=str(path), qualname=mod, parent=None,
         signature=None, docstring=ast.get_docstring(tree), start=1,
-        end=len(lines)+1, hash=_sha(src), imports=[], decorators=[]
+        end=len(lines)+1, hash=_sha(src), imports=sorted(set(module_aliases.values())), decorators=[]
     ))
     return out
 
-def index_repo(root: str, all_: bool = True, changed_only: bool = False) -> List[Symbol]:
+def _package_root(root: Path) -> Path:
+    # If src folder exists, use it as root for package names
+    if (root / "src").exists():
+        return root / "src"
+    return root
+
+def _parse_chunk(paths: List[Path], package_root: Path, repo_root: Optional[Path] = None) -> List[Symbol]:
+    """Parse a batch of files (runs inside worker processes)."""
+    out = []
+    for p in paths:
+        out.extend(parse_symbols_file(p, package_root, repo_root))
+    return out
+
+def iter_index_repo(root: str, workers: int = 1, chunk_size: int = 64,
+                    discovery: str = "auto",
+                    include: Optional[List[str]] = None,
+                    exclude: Optional[List[str]] = None) -> Iterator[List[Symbol]]:
     """
-    Main entry point to parse the repository.
-    For now, 'all_' is assumed True or we just parse everything.
-    'changed_only' logic would go here (git diff).
+    Parse the repository, yielding Symbol batches as soon as they are ready.
+    With workers > 1 files are parsed in chunks on a process pool;
+    workers <= 0 means one per CPU core. Batches come out in file order.
+    discovery/include/exclude are passed to collect_py_files.
     """
     src_root = Path(root)
-    # If src folder exists, use it as root for package names
-    if (src_root / "src").exists():
-        package_root = src_root / "src"
-    else:
-        package_root = src_root
-
-    files = collect_py_files(str(src_root))
-    all_symbols = []
+    package_root = _package_root(src_root)
+    files = collect_py_files(str(src_root), mode=discovery, include=include, exclude=exclude)
+    
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    chunk_size = max(1, chunk_size)
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
     
     print(f"Indexing {len(files)} files in {src_root}...")
     
-    for f in files:
-        syms = parse_symbols_file(f, package_root)
-        all_symbols.extend(syms)
-        
+    # Not worth spinning up processes for a handful of chunks
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield _parse_chunk(chunk, package_root, src_root)
+        return
+    
+    # Not fork: by now the parent usually holds the embedding model and cache threads,
+    # which would be copied into every worker (and can deadlock a forked child)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context) as executor:
+        for batch in executor.map(_parse_chunk, chunks, [package_root] * len(chunks), [src_root] * len(chunks)):
+            yield batch
+
+def index_repo(root: str, all_: bool = True, changed_only: bool = False,
+               workers: int = 1, chunk_size: int = 64, **discover_kwargs) -> List[Symbol]:
+    """
+    Main entry point to parse the repository.
+    For now, 'all_' is assumed True or we just parse everything.
+    'changed_only' logic would go here (git diff).
+    """
+    all_symbols = []
+    for batch in iter_index_repo(root, workers=workers, chunk_size=chunk_size, **discover_kwargs):
+        all_symbols.extend(batch)
     return all_symbols
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, List
 
 @dataclass
@@ -15,3 +15,4 @@ class Symbol:
     hash: str
     imports: List[str]
     decorators: List[str]
+    calls: List[str] = field(default_factory=list)  # qualnames this symbol calls or inherits from
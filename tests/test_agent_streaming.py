@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from agentic_docs.agent.agents import DocumentationAgents, action_end
+
+
+class ChunkedLLM:
+    """Streams a canned completion in fixed-size multi-character chunks."""
+
+    def __init__(self, text: str, size: int):
+        self.text = text
+        self.size = size
+        self.closed = False
+
+    def stream(self, prompt, stop=None):
+        try:
+            for i in range(0, len(self.text), self.size):
+                yield self.text[i:i + self.size]
+        finally:
+            self.closed = True
+
+
+def ask(text: str, size: int) -> str:
+    agents = DocumentationAgents(ChunkedLLM(text, size))
+    return agents.ask_agent("def f(): pass", "", "", "get_symbol", "- get_symbol: look up", stream=True)
+
+
+@pytest.mark.parametrize("size", [3, 7, 16])
+def test_single_line_input_is_cut_at_end_of_line(size):
+    text = 'Thought: look it up\nAction: get_symbol\nAction Input: "helper"\nObservation: made up\n'
+    out = ask(text, size)
+    assert out == 'Thought: look it up\nAction: get_symbol\nAction Input: "helper"'
+
+
+@pytest.mark.parametrize("size", [4, 9, 32])
+def test_multiline_json_input_is_kept_whole(size):
+    text = 'Action: read_file\nAction Input: {\n  "file_path": "a.py",\n  "start": 3\n}\nObservation: x'
+    out = ask(text, size)
+    assert out.endswith('"start": 3\n}')
+    assert "Observation" not in out
+
+
+def test_action_end_waits_for_complete_input():
+    assert action_end("Action: read_file\nAction Input: {\n") is None
+    assert action_end("Action: read_file\nAction Input: a.py") is None
+    assert action_end("Thought: done\nFinal Answer: ok\nAction: x\nAction Input: y\n") is None
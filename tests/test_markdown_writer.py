@@ -0,0 +1,21 @@
+import os
+import stat
+
+from agentic_docs.io import markdown_writer
+from agentic_docs.io.markdown_writer import _atomic_write
+
+
+def test_atomic_write_keeps_existing_mode(tmp_path):
+    page = tmp_path / "page.md"
+    page.write_text("old", encoding="utf-8")
+    os.chmod(page, 0o644)
+    _atomic_write(page, "new")
+    assert page.read_text(encoding="utf-8") == "new"
+    assert stat.S_IMODE(os.stat(page).st_mode) == 0o644
+
+
+def test_atomic_write_new_page_follows_umask(tmp_path, monkeypatch):
+    monkeypatch.setattr(markdown_writer, "_UMASK", 0o022)
+    page = tmp_path / "new.md"
+    _atomic_write(page, "text")
+    assert stat.S_IMODE(os.stat(page).st_mode) == 0o644